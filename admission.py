@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # fcntl is POSIX-only; SharedSlots is unavailable elsewhere
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed; retry_after is a suggested wait in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SharedSlots:
+    """A fixed number of slots shared by the worker processes on one host.
+
+    Each slot is an flock()ed file, so claiming one is a non-blocking system
+    call and the kernel releases the slots of a worker that crashes.
+    """
+
+    def __init__(self, path_prefix: str, count: int, poll_interval: float = 0.02):
+        if fcntl is None:
+            raise RuntimeError("Shared LLM slots need fcntl (POSIX)")
+        self.count = count
+        self.poll_interval = poll_interval
+        self._files = [open(f"{path_prefix}.{i}", "a+") for i in range(count)]
+        self._held: Set[int] = set()
+
+    def try_acquire(self) -> Optional[int]:
+        """Claim a free slot and return its number, or None if all are taken"""
+        for slot, file in enumerate(self._files):
+            if slot in self._held:
+                continue  # flock() would succeed again on our own lock
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            self._held.add(slot)
+            return slot
+        return None
+
+    async def acquire(self, timeout: float) -> Optional[int]:
+        """Wait up to timeout seconds for a slot; None if none became free"""
+        deadline = time.monotonic() + timeout
+        while True:
+            slot = self.try_acquire()
+            if slot is not None or time.monotonic() >= deadline:
+                return slot
+            await asyncio.sleep(self.poll_interval)
+
+    def release(self, slot: int) -> None:
+        self._held.discard(slot)
+        fcntl.flock(self._files[slot], fcntl.LOCK_UN)
+
+
+class AdmissionController:
+    """Caps concurrent LLM work so requests queue here, in order, instead of inside Ollama.
+
+    At most `max_in_flight` holders run at once. Further requests wait in a
+    FIFO queue of at most `max_queue` entries for up to `queue_timeout`
+    seconds; a request that finds the queue full, or whose wait runs out, is
+    rejected with OverloadedError. Its retry_after is estimated from the
+    recent average hold time and the queue length. With `shared_slots`, an
+    admitted request also claims one of those slots, so the cap holds across
+    all worker processes.
+    """
+
+    def __init__(self, max_in_flight: int = 1, max_queue: int = 16, queue_timeout: float = 10.0,
+                 shared_slots: Optional[SharedSlots] = None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.shared_slots = shared_slots
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_hold = 5.0  # seconds; moving average of completed holds
+        self._stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_timeout": 0}
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None, resume: bool = False) -> AsyncIterator[None]:
+        """Hold one of the max_in_flight slots for the duration of the block.
+
+        `resume` is for later rounds of already admitted work: it waits at the
+        front of the queue and is never shed because the queue is full.
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.monotonic()
+        await self._acquire(timeout, resume)
+        shared_slot = None
+        if self.shared_slots is not None:
+            # Other workers may hold the remaining slots: wait out the rest of the deadline
+            try:
+                shared_slot = await self.shared_slots.acquire(max(0.0, started + timeout - time.monotonic()))
+            except BaseException:
+                self._release()
+                raise
+            if shared_slot is None:
+                self._release()
+                self._stats["shed_timeout"] += 1
+                raise OverloadedError(f"No chat capacity within {timeout:.0f}s, try again later", self.retry_after())
+        held_from = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * (time.monotonic() - held_from)
+            if shared_slot is not None:
+                self.shared_slots.release(shared_slot)
+            self._release()
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely get a slot"""
+        rounds = (len(self._waiters) + self._in_flight) / self.max_in_flight
+        return max(1, math.ceil(rounds * self._avg_hold))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["in_flight"] = self._in_flight
+        stats["queue_depth"] = len(self._waiters)
+        stats["avg_hold_seconds"] = round(self._avg_hold, 3)
+        if self.shared_slots is not None:
+            stats["shared_slots"] = self.shared_slots.count
+        return stats
+
+    async def _acquire(self, timeout: float, resume: bool = False) -> None:
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue and not resume:
+            self._stats["shed_queue_full"] += 1
+            raise OverloadedError("Too many chat requests in progress, try again later", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        if resume:
+            self._waiters.appendleft(waiter)
+        else:
+            self._waiters.append(waiter)
+        self._stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self._release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._stats["shed_timeout"] += 1
+            raise OverloadedError(f"No chat capacity within {timeout:.0f}s, try again later", self.retry_after())
+        self._stats["admitted"] += 1
+
+    def _release(self) -> None:
+        if self._waiters:
+            # Hand the slot straight to the oldest waiter; _in_flight stays the same
+            self._waiters.popleft().set_result(None)
+        else:
+            self._in_flight -= 1
@@ -0,0 +1,67 @@
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Sequence
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean and max of latency samples (seconds in, milliseconds out)"""
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        # Nearest-rank percentile
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def git_revision() -> str:
+    """Short commit hash of the working tree ("+dirty" if it has changes), or "unknown" """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return revision + ("+dirty" if dirty else "")
+
+
+def save_results(kind: str, results: List[Dict[str, Any]], settings: Dict[str, Any], output_dir: str = RESULTS_DIR) -> str:
+    """Write results as <output_dir>/<kind>-<revision>.json and return the path"""
+    revision = git_revision()
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{kind}-{revision}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "kind": kind,
+            "revision": revision,
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "settings": settings,
+            "results": results,
+        }, f, indent=2)
+    return path
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]) -> None:
+    widths = {column: max([len(column)] + [len(str(row.get(column, ""))) for row in rows]) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).ljust(widths[column]) for column in columns))
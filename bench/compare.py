@@ -0,0 +1,68 @@
+"""Compare two saved benchmark runs (e.g. from two commits) and flag regressions.
+
+    python -m bench.compare bench/results/load-abc1234.json bench/results/load-def5678.json --threshold 10
+
+Exits with status 1 if any latency percentile got worse (or throughput dropped)
+by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+from bench.common import print_table
+
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("ops_per_s", "throughput_rps")
+
+
+def row_key(row: Dict[str, Any]) -> str:
+    return str(row.get("name", row.get("concurrency")))
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    old_rows = {row_key(row): row for row in old["results"]}
+    rows = []
+    for new_row in new["results"]:
+        old_row = old_rows.get(row_key(new_row))
+        if old_row is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if metric not in new_row or not old_row.get(metric):
+                continue
+            change = (new_row[metric] - old_row[metric]) / old_row[metric] * 100
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            rows.append({
+                "benchmark": row_key(new_row),
+                "metric": metric,
+                "old": old_row[metric],
+                "new": new_row[metric],
+                "change_%": f"{change:+.1f}",
+                "verdict": "REGRESSION" if worse else "",
+            })
+    return rows
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if old["kind"] != new["kind"]:
+        sys.exit(f"Cannot compare a {old['kind']} run with a {new['kind']} run")
+
+    print(f"{old['kind']}: {old['revision']} -> {new['revision']}")
+    rows = compare(old, new, args.threshold)
+    print_table(rows, ["benchmark", "metric", "old", "new", "change_%", "verdict"])
+    if any(row["verdict"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,262 @@
+"""Local stand-ins for Ollama and Nominatim, so the app can be benchmarked offline.
+
+    python -m bench.fakes --ollama-port 11435 --nominatim-port 8089 --latency 0.05
+
+then run the app with OLLAMA_HOST=http://127.0.0.1:11435 and
+NOMINATIM_URL=http://127.0.0.1:8089.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Default tool-call script: geocode, then search near the result, then answer
+DEFAULT_SCRIPT = [
+    {"tool_calls": [{"function": {"name": "geocode_address", "arguments": {"address": "{message}"}}}]},
+    {"tool_calls": [{"function": {"name": "find_nearby_places",
+                                  "arguments": {"lat": 48.8584, "lng": 2.2945, "place_type": "cafe", "radius_km": 2}}}]},
+    {"content": "Here is what I found near {message}."},
+]
+
+
+class FakeBehavior:
+    """Latency and failure settings shared by a fake server's handler threads"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_request(self) -> Tuple[float, bool]:
+        """(delay in seconds, whether to fail) for the next request"""
+        with self._lock:
+            self.requests += 1
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+            return delay, self._random.random() < self.error_rate
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    behavior: FakeBehavior
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _delay_or_fail(self) -> bool:
+        """Sleep for the configured latency; returns True if an error response was sent"""
+        delay, fail = self.behavior.next_request()
+        time.sleep(delay)
+        if fail:
+            self._send_json({"error": "injected failure"}, status=self.behavior.error_status)
+        return fail
+
+
+class FakeOllamaHandler(_FakeHandler):
+    """Subset of the Ollama API: /api/chat (streaming or not), /api/tags, /api/embed.
+
+    Chat replies follow a script: the n-th model round after the latest user
+    message gets script[n], a dict with either "tool_calls" or "content".
+    "{message}" in a script string is replaced by the latest user message.
+    Rounds without tools always get the final content entry.
+    """
+    script: List[Dict[str, Any]] = DEFAULT_SCRIPT
+    model = "qwen2.5:14b"
+    tokens_per_second = 0.0  # >0 spreads streamed content over time
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        if path == "/api/tags":
+            self._send_json({"models": [{"name": self.model, "model": self.model, "size": 0,
+                                         "modified_at": _now(), "digest": "0" * 64}]})
+        elif path in ("/", "/api/version"):
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        path = urlparse(self.path).path
+        body = self._read_json()
+        if self._delay_or_fail():
+            return
+        if path == "/api/chat":
+            self._chat(body)
+        elif path == "/api/embed":
+            inputs = body.get("input")
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            self._send_json({"model": body.get("model"), "embeddings": [_embedding(str(text)) for text in inputs]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _chat(self, body: Dict[str, Any]) -> None:
+        messages = body.get("messages") or []
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        user_text = messages[last_user]["content"] if last_user >= 0 else ""
+        rounds = sum(1 for m in messages[last_user + 1:] if m.get("role") == "assistant")
+
+        entry = self.script[min(rounds, len(self.script) - 1)]
+        if not body.get("tools") or "tool_calls" not in entry:
+            entry = next((e for e in reversed(self.script) if "content" in e), {"content": "OK"})
+        message = {"role": "assistant", "content": entry.get("content", "").replace("{message}", user_text)}
+        if "tool_calls" in entry:
+            message["tool_calls"] = json.loads(json.dumps(entry["tool_calls"]).replace("{message}", user_text))
+
+        if not body.get("stream", True):
+            self._send_json(_chat_chunk(body.get("model"), message, done=True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = message["content"].split(" ")
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            self._write_chunk(_chat_chunk(body.get("model"), {"role": "assistant", "content": text}, done=False))
+            if self.tokens_per_second > 0:
+                time.sleep(1 / self.tokens_per_second)
+        final = {"role": "assistant", "content": ""}
+        if "tool_calls" in message:
+            final["tool_calls"] = message["tool_calls"]
+        self._write_chunk(_chat_chunk(body.get("model"), final, done=True))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload: Dict[str, Any]) -> None:
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeNominatimHandler(_FakeHandler):
+    """Nominatim /search and /status with deterministic results derived from the query"""
+    results_per_query = 5
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == "/status":
+            self._send_json({"status": 0, "message": "OK"})
+            return
+        if url.path != "/search":
+            self._send_json({"error": "not found"}, status=404)
+            return
+        if self._delay_or_fail():
+            return
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        limit = min(int(params.get("limit", self.results_per_query)), self.results_per_query)
+        self._send_json([_place(params.get("q", ""), i, params.get("viewbox")) for i in range(limit)])
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _chat_chunk(model: Optional[str], message: Dict[str, Any], done: bool) -> Dict[str, Any]:
+    chunk = {"model": model, "created_at": _now(), "message": message, "done": done}
+    if done:
+        chunk.update({"done_reason": "stop", "total_duration": 0, "eval_count": len(message.get("content", "")) // 4})
+    return chunk
+
+
+def _seed(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _embedding(text: str, dims: int = 64) -> List[float]:
+    rng = random.Random(_seed(text.lower().strip()))
+    return [rng.uniform(-1, 1) for _ in range(dims)]
+
+
+def _place(query: str, i: int, viewbox: Optional[str]) -> Dict[str, Any]:
+    rng = random.Random(_seed(f"{query}#{i}"))
+    if viewbox:
+        # Stay inside the requested box so bounded searches look realistic
+        left, top, right, bottom = (float(v) for v in viewbox.split(","))
+        lat, lon = rng.uniform(bottom, top), rng.uniform(left, right)
+    else:
+        lat, lon = 48.8 + rng.uniform(-0.1, 0.1), 2.3 + rng.uniform(-0.1, 0.1)
+    name = query.split(",")[0].strip().title() or "Place"
+    return {
+        "place_id": _seed(f"{query}#{i}"),
+        "lat": f"{lat:.7f}",
+        "lon": f"{lon:.7f}",
+        "display_name": f"{name} {i + 1}, Rue de Test {rng.randint(1, 200)}, Paris, France",
+        "class": "amenity",
+        "type": rng.choice(["cafe", "restaurant", "pharmacy", "hotel"]),
+        "importance": round(rng.uniform(0.1, 0.9), 4),
+    }
+
+
+def start_server(handler: type, port: int, behavior: FakeBehavior, host: str = "127.0.0.1", **attributes: Any) -> ThreadingHTTPServer:
+    """Serve handler on a daemon thread; port 0 picks a free port (see server.server_address)"""
+    handler_class = type(handler.__name__, (handler,), dict(attributes, behavior=behavior))
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"{handler.__name__}-{port}", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--nominatim-port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Nominatim latency per request (seconds)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Ollama latency per chat round (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Streaming speed (0 = instant)")
+    parser.add_argument("--script", help="JSON file with the chat script (list of rounds)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    start_server(FakeOllamaHandler, args.ollama_port,
+                 FakeBehavior(args.llm_latency, args.jitter, args.error_rate, args.error_status),
+                 host=args.host, script=script, tokens_per_second=args.tokens_per_second)
+    start_server(FakeNominatimHandler, args.nominatim_port,
+                 FakeBehavior(args.latency, args.jitter, args.error_rate, args.error_status), host=args.host)
+    logger.info(f"Fake Ollama on http://{args.host}:{args.ollama_port}, "
+                f"fake Nominatim on http://{args.host}:{args.nominatim_port} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Load generator for /chat: latency percentiles and throughput per concurrency level.
+
+    # Against a running app
+    python -m bench.load --url http://localhost:8000 --concurrency 1,4,16 --requests 200
+
+    # Fully offline: start the fakes and the app (with uvicorn) automatically
+    python -m bench.load --spawn --concurrency 1,4,16 --llm-latency 0.2 --save
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.common import percentiles, print_table, save_results
+from bench.fakes import FakeBehavior, FakeNominatimHandler, FakeOllamaHandler, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MESSAGES = [
+    "Find cafes near the Eiffel Tower",
+    "Where is the Louvre?",
+    "Pharmacies near Gare du Nord",
+    "How do I get from Montmartre to the Pantheon?",
+]
+
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, total: int,
+                    messages: List[str], unique: bool) -> Dict[str, Any]:
+    """Send `total` chat requests with `concurrency` in flight and summarize the latencies"""
+    counter = itertools.count()
+    run_id = time.time_ns() % 1_000_000
+    samples: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def worker():
+        while (i := next(counter)) < total:
+            message = messages[i % len(messages)]
+            if unique:
+                # Defeat the response cache so every request does the full pipeline
+                message = f"{message} (request {run_id}-{i})"
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/chat", json={"message": message})
+                status = str(response.status_code) if response.status_code != 200 else None
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if status is None:
+                samples.append(time.perf_counter() - started)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return dict(
+        concurrency=concurrency,
+        requests=total,
+        ok=len(samples),
+        errors=sum(errors.values()),
+        error_kinds=errors,
+        throughput_rps=round(len(samples) / elapsed, 2),
+        **percentiles(samples),
+    )
+
+
+async def run_all(url: str, levels: List[int], total: int, messages: List[str], unique: bool, warmup: int) -> List[Dict[str, Any]]:
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        if warmup:
+            await run_level(client, url, 1, warmup, messages, unique=True)
+        return [await run_level(client, url, level, total, messages, unique) for level in levels]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_app(args: argparse.Namespace) -> subprocess.Popen:
+    """Start the fakes in this process and the app in a subprocess wired to them"""
+    ollama = start_server(FakeOllamaHandler, 0, FakeBehavior(args.llm_latency, args.jitter, args.error_rate))
+    nominatim = start_server(FakeNominatimHandler, 0, FakeBehavior(args.latency, args.jitter, args.error_rate))
+    port = _free_port()
+    env = dict(
+        os.environ,
+        OLLAMA_HOST=f"http://127.0.0.1:{ollama.server_address[1]}",
+        NOMINATIM_URL=f"http://127.0.0.1:{nominatim.server_address[1]}",
+        NOMINATIM_RATE_LIMIT="100000",
+        NOMINATIM_BURST="100000",
+        GEOCODE_CACHE_PATH=os.path.join(tempfile.mkdtemp(prefix="bench-"), "geocode_cache.sqlite3"),
+        LOG_LEVEL="WARNING",
+        LOG_FILE="",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    args.url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{args.url}/health/live", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not become live within 30s")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--repeat-messages", action="store_true",
+                        help="Reuse the same messages (exercises the response cache) instead of unique ones")
+    parser.add_argument("--messages", help="File with one chat message per line")
+    parser.add_argument("--spawn", action="store_true", help="Start the fakes and the app locally")
+    parser.add_argument("--latency", type=float, default=0.02, help="--spawn: fake Nominatim latency (seconds)")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="--spawn: fake Ollama latency per round")
+    parser.add_argument("--jitter", type=float, default=0.0, help="--spawn: +/- random latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="--spawn: fraction of upstream failures")
+    parser.add_argument("--save", action="store_true", help="Write bench/results/load-<revision>.json")
+    args = parser.parse_args()
+
+    messages = DEFAULT_MESSAGES
+    if args.messages:
+        with open(args.messages) as f:
+            messages = [line.strip() for line in f if line.strip()]
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    process: Optional[subprocess.Popen] = spawn_app(args) if args.spawn else None
+    try:
+        results = asyncio.run(run_all(args.url, levels, args.requests, messages, not args.repeat_messages, args.warmup))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print_table(results, ["concurrency", "requests", "ok", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+    if args.save:
+        print(f"Saved {save_results('load', results, vars(args))}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,130 @@
+"""Microbenchmarks for tool functions and result shaping, run against the local fakes.
+
+    python -m bench.micro [--iterations 2000] [--filter places] [--save]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from bench.common import percentiles, print_table, save_results
+from bench.fakes import FakeBehavior, FakeNominatimHandler, _place, start_server
+
+# The app reads its configuration at import time, so point it at the fakes first
+_nominatim = start_server(FakeNominatimHandler, 0, FakeBehavior())
+os.environ.update({
+    "NOMINATIM_URL": f"http://127.0.0.1:{_nominatim.server_address[1]}",
+    "NOMINATIM_RATE_LIMIT": "100000",
+    "NOMINATIM_BURST": "100000",
+    "GEOCODE_CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-"), "geocode_cache.sqlite3"),
+    "RESPONSE_CACHE_ENABLED": "0",
+    "FAST_PATH_MODE": "on",
+    "LOG_LEVEL": "WARNING",
+    "LOG_FILE": "",
+})
+
+import main  # noqa: E402
+from routing import haversine_matrix_m  # noqa: E402
+from sessions import compact_messages  # noqa: E402
+from spatial import PlaceIndex  # noqa: E402
+from respcache import ResponseCache  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+
+def run_sync(name: str, func: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - started)
+    return dict(name=name, iterations=iterations, ops_per_s=round(iterations / sum(samples), 1), **percentiles(samples))
+
+
+async def run_async(name: str, func: Callable[[int], Awaitable[Any]], iterations: int) -> Dict[str, Any]:
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await func(i)
+        samples.append(time.perf_counter() - started)
+    return dict(name=name, iterations=iterations, ops_per_s=round(iterations / sum(samples), 1), **percentiles(samples))
+
+
+def sync_benchmarks() -> Dict[str, Callable[[int], Any]]:
+    raw = [_place("cafe", i, None) for i in range(50)]
+    shaped = {"status": "success", "places": main.places_from_nominatim(raw[:5]), "query": "cafe"}
+    nearby_call = {
+        "function": "find_nearby_places",
+        "arguments": {"lat": 48.85, "lng": 2.35, "place_type": "cafe"},
+        "result": {"status": "success", "radius_km": 2, "places": [dict(p, distance_km=0.5) for p in shaped["places"]]},
+    }
+
+    rng = np.random.default_rng(0)
+    index = PlaceIndex(cell_deg=0.01)
+    index.add_many([
+        {"name": f"place {i}", "coordinates": {"lat": float(lat), "lng": float(lng)}, "type": "cafe" if i % 7 == 0 else "shop"}
+        for i, (lat, lng) in enumerate(zip(rng.uniform(48.7, 49.0, 100_000), rng.uniform(2.1, 2.5, 100_000)))
+    ])
+    origins = rng.uniform([48.7, 2.1], [49.0, 2.5], (100, 2))
+
+    main.geocode_cache.set("bench-key", {"status": "success", "coordinates": {"lat": 1.0, "lng": 2.0}})
+    history = []
+    for i in range(20):
+        history.append({"role": "user", "content": f"Find cafes near landmark {i} " + "please " * 10})
+        history.append({"role": "assistant", "content": "Here are some cafes: " + ", ".join(f"Cafe {j}" for j in range(30))})
+
+    return {
+        "places_from_nominatim[50]": lambda i: main.places_from_nominatim(raw),
+        "json_dumps_tool_result": lambda i: json.dumps(shaped),
+        "render_tool_results": lambda i: main.render_tool_results([nearby_call]),
+        "haversine_matrix[100x100]": lambda i: haversine_matrix_m(origins, origins),
+        "place_index_query[100k,1km]": lambda i: index.query_radius(48.85, 2.35, 1.0, "cafe", limit=10),
+        "geocode_cache_memory_hit": lambda i: main.geocode_cache.get("bench-key"),
+        "response_cache_make_keys[40 msgs]": lambda i: ResponseCache.make_keys(history, main.OLLAMA_MODEL, main.tools),
+        "compact_messages[40 msgs]": lambda i: compact_messages(history, 1024),
+    }
+
+
+def async_benchmarks() -> Dict[str, Callable[[int], Awaitable[Any]]]:
+    return {
+        # Unique queries miss the geocode cache and go through the scheduler to the fake
+        "search_places_async[fake nominatim]": lambda i: main.search_places_async(f"cafe {i} {random.random()}"),
+        "geocode_address_async[cache hit]": lambda i: main.geocode_address_async("Eiffel Tower, Paris"),
+        "tool_registry_call[geocode hit]": lambda i: main.tool_registry.call("geocode_address", {"address": "Eiffel Tower, Paris"}),
+    }
+
+
+async def run_all(iterations: int, name_filter: str) -> List[Dict[str, Any]]:
+    results = []
+    for name, func in sync_benchmarks().items():
+        if name_filter in name:
+            results.append(run_sync(name, func, iterations))
+    benchmarks = async_benchmarks()
+    await main.geocode_address_async("Eiffel Tower, Paris")  # warm the cache for the hit benchmarks
+    for name, func in benchmarks.items():
+        if name_filter in name:
+            results.append(await run_async(name, func, iterations))
+    await main.close_http_client()
+    main.tool_registry.shutdown()
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--save", action="store_true", help="Write bench/results/micro-<revision>.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_all(args.iterations, args.filter))
+    print_table(results, ["name", "iterations", "ops_per_s", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+    if args.save:
+        print(f"Saved {save_results('micro', results, vars(args))}")
+
+
+if __name__ == "__main__":
+    main_cli()
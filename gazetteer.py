@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from geocache import normalize_query
+from osm import iter_osm
+from spatial import PlaceIndex
+
+logger = logging.getLogger(__name__)
+
+# Rough stand-in for Nominatim's importance (0..1), which is not part of OSM data
+PLACE_IMPORTANCE = {
+    "country": 1.0, "state": 0.9, "region": 0.85, "province": 0.85, "city": 0.8,
+    "town": 0.65, "village": 0.5, "suburb": 0.45, "borough": 0.45, "quarter": 0.4,
+    "neighbourhood": 0.35, "hamlet": 0.3, "locality": 0.25,
+}
+FEATURE_KEYS = ("place", "tourism", "historic", "amenity", "shop", "leisure", "railway",
+                "aeroway", "building", "natural", "highway", "office")
+NAME_TAGS = ("name", "name:en", "official_name", "alt_name")
+
+
+def normalize_name(text: str) -> str:
+    """Key normalization shared by the build step and lookups"""
+    return " ".join(normalize_query(text).replace(",", " ").split())
+
+
+def feature_importance(tags: Dict[str, str]) -> float:
+    if "place" in tags:
+        importance = PLACE_IMPORTANCE.get(tags["place"], 0.3)
+    elif "highway" in tags:
+        importance = 0.1
+    else:
+        importance = 0.2
+    if "wikidata" in tags or "wikipedia" in tags:
+        importance += 0.15
+    if "tourism" in tags or "historic" in tags:
+        importance += 0.05
+    return min(importance, 1.0)
+
+
+def build_gazetteer(extract_path: str, output_dir: str) -> int:
+    """Build a gazetteer directory from an OSM extract; returns the number of rows written.
+
+    Layout (all arrays share one row order, sorted by normalized name):
+      keys.bin / key_offsets.npy          concatenated UTF-8 names and their offsets
+      lat.npy, lon.npy, importance.npy    packed per-row values
+      display.bin / display_offsets.npy   display names
+      meta.json                           row count and build info
+    """
+    started = time.perf_counter()
+    coords: Dict[int, Tuple[float, float]] = {}
+    features: List[Tuple[float, float, Dict[str, str], str]] = []
+    places = PlaceIndex(cell_deg=0.1)
+
+    for kind, osm_id, data, tags in iter_osm(extract_path):
+        if kind == "node":
+            coords[osm_id] = data
+        if "name" not in tags:
+            continue
+        feature_key = next((key for key in FEATURE_KEYS if key in tags), None)
+        if feature_key is None:
+            continue
+        if kind == "node":
+            lat, lng = data
+        else:
+            # Ways are placed at the centroid of their nodes
+            points = [coords[ref] for ref in data if ref in coords]
+            if not points:
+                continue
+            lat = sum(p[0] for p in points) / len(points)
+            lng = sum(p[1] for p in points) / len(points)
+        features.append((lat, lng, tags, tags[feature_key]))
+        if tags.get("place") in ("city", "town", "village", "suburb"):
+            places.add({"name": tags["name"], "coordinates": {"lat": lat, "lng": lng}, "type": tags["place"]})
+    del coords
+
+    rows = []
+    for lat, lng, tags, feature_type in features:
+        parts = [tags["name"]]
+        street = " ".join(filter(None, [tags.get("addr:housenumber"), tags.get("addr:street")]))
+        if street:
+            parts.append(street)
+        city = tags.get("addr:city")
+        if not city and "place" not in tags:
+            # Borrow the nearest settlement's name so "Eiffel Tower, Paris" can match
+            nearest = places.nearest(lat, lng, k=1, max_radius_km=25)
+            city = nearest[0]["name"] if nearest else None
+        if city and city != tags["name"]:
+            parts.append(city)
+        display = ", ".join(parts)
+        importance = feature_importance(tags)
+        for name in {tags[t] for t in NAME_TAGS if t in tags}:
+            for alias in name.split(";"):
+                key = normalize_name(alias)
+                if key:
+                    rows.append((key.encode("utf-8"), lat, lng, importance, f"{display}|{feature_type}"))
+
+    rows.sort(key=lambda row: (row[0], -row[3]))
+    os.makedirs(output_dir, exist_ok=True)
+    _write_strings(os.path.join(output_dir, "keys.bin"), os.path.join(output_dir, "key_offsets.npy"), [r[0] for r in rows])
+    _write_strings(os.path.join(output_dir, "display.bin"), os.path.join(output_dir, "display_offsets.npy"),
+                   [r[4].encode("utf-8") for r in rows])
+    np.save(os.path.join(output_dir, "lat.npy"), np.array([r[1] for r in rows], dtype=np.float64))
+    np.save(os.path.join(output_dir, "lon.npy"), np.array([r[2] for r in rows], dtype=np.float64))
+    np.save(os.path.join(output_dir, "importance.npy"), np.array([r[3] for r in rows], dtype=np.float32))
+    with open(os.path.join(output_dir, "meta.json"), "w") as f:
+        json.dump({"rows": len(rows), "source": os.path.basename(extract_path), "built_at": time.time()}, f)
+
+    logger.info(f"Built gazetteer with {len(rows)} names from {extract_path} in {time.perf_counter() - started:.1f}s")
+    return len(rows)
+
+
+def _write_strings(data_path: str, offsets_path: str, values: List[bytes]) -> None:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    with open(data_path, "wb") as f:
+        for value in values:
+            f.write(value)
+    np.save(offsets_path, offsets)
+
+
+class Gazetteer:
+    """Read-only, memory-mapped name index built by build_gazetteer.
+
+    Nothing is read into RAM up front: lookups binary-search the sorted key
+    table through the page cache, so startup is instant and memory use stays
+    proportional to the pages actually touched.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.size = self.meta["rows"]
+        self._keys = self._memmap_bytes("keys.bin")
+        self._key_offsets = self._load_array("key_offsets.npy")
+        self._display = self._memmap_bytes("display.bin")
+        self._display_offsets = self._load_array("display_offsets.npy")
+        self._lat = self._load_array("lat.npy")
+        self._lon = self._load_array("lon.npy")
+        self._importance = self._load_array("importance.npy")
+        logger.info(f"Opened gazetteer at {directory} ({self.size} names)")
+
+    def lookup(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Places matching a free-text query, shaped like search_places results, best first"""
+        parts = [normalize_name(part) for part in (query or "").split(",")]
+        tokens = parts[0].split()
+        context = " ".join(parts[1:]).split()
+
+        # Try the whole name first, then drop trailing words into the context
+        # ("eiffel tower paris" -> "eiffel tower" + context "paris")
+        rows: List[int] = []
+        while tokens and not rows:
+            name = " ".join(tokens).encode("utf-8")
+            rows = list(self._exact(name)) or list(self._prefix(name, limit * 4))
+            if not rows:
+                context.insert(0, tokens.pop())
+
+        scored = []
+        for row in rows:
+            display, place_type = self._string(self._display, self._display_offsets, row).rsplit("|", 1)
+            score = float(self._importance[row])
+            if context:
+                display_norm = normalize_name(display)
+                score += 0.5 * sum(token in display_norm for token in context) / len(context)
+            scored.append((score, row, display, place_type))
+        scored.sort(key=lambda item: -item[0])
+
+        results = []
+        seen = set()
+        for _, row, display, place_type in scored:
+            if display in seen:
+                continue
+            seen.add(display)
+            results.append({
+                "name": display.split(",")[0],
+                "address": display,
+                "coordinates": {"lat": float(self._lat[row]), "lng": float(self._lon[row])},
+                "type": place_type,
+                "importance": round(float(self._importance[row]), 4),
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def _load_array(self, name: str) -> np.ndarray:
+        # Empty arrays cannot be memory-mapped
+        return np.load(os.path.join(self.directory, name), mmap_mode="r" if self.size else None)
+
+    def _memmap_bytes(self, name: str) -> np.ndarray:
+        path = os.path.join(self.directory, name)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode="r")
+
+    @staticmethod
+    def _string(data: np.ndarray, offsets: np.ndarray, row: int) -> str:
+        return data[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def _key(self, row: int) -> bytes:
+        return self._keys[self._key_offsets[row]:self._key_offsets[row + 1]].tobytes()
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _exact(self, key: bytes) -> range:
+        start = self._lower_bound(key)
+        end = start
+        while end < self.size and self._key(end) == key:
+            end += 1
+        return range(start, end)
+
+    def _prefix(self, prefix: bytes, limit: int) -> range:
+        start = self._lower_bound(prefix)
+        end = start
+        while end < self.size and end - start < limit and self._key(end).startswith(prefix):
+            end += 1
+        return range(start, end)
+
+
+if __name__ == "__main__":
+    # python gazetteer.py city.osm.pbf gazetteer/
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 3:
+        print("Usage: python gazetteer.py <extract.osm|.osm.bz2|.pbf> <output directory>")
+        sys.exit(1)
+    build_gazetteer(sys.argv[1], sys.argv[2])
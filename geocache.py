@@ -0,0 +1,155 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a free-text query so trivially different spellings share a cache entry"""
+    text = _WHITESPACE_RE.sub(" ", (text or "").strip().lower())
+    return text.strip(" ,.;")
+
+
+class GeoCache:
+    """Two-level geocoding cache: in-memory LRU in front of a persistent SQLite store.
+
+    Entries carry their own expiry time, so successful lookups and negative
+    results ("Address not found") can be kept for different durations. Expired
+    entries stay on disk for another `stale_seconds` so get_stale() can still
+    serve them while the upstream is down.
+    """
+
+    def __init__(
+        self,
+        path: str = "geocode_cache.sqlite3",
+        max_memory_entries: int = 1024,
+        ttl_seconds: float = 7 * 24 * 3600,
+        negative_ttl_seconds: float = 3600,
+        stale_seconds: float = 0,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.stale_seconds = stale_seconds
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "writes": 0, "stale_hits": 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        logger.info(f"Geocode cache opened at '{path}' (memory entries: {max_memory_entries})")
+
+    @staticmethod
+    def make_key(kind: str, query: str, **params: Any) -> str:
+        """Build a cache key from the lookup kind, normalized query and extra parameters"""
+        extra = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{kind}|{normalize_query(query)}|{extra}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM geocache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            value_json, expires_at = row
+            if expires_at <= now:
+                if expires_at + self.stale_seconds <= now:
+                    self._conn.execute("DELETE FROM geocache WHERE key = ?", (key,))
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            value = json.loads(value_json)
+            self._remember(key, expires_at, value)
+            self._stats["disk_hits"] += 1
+            return value
+
+    def get_stale(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the value for key even if expired (within the stale window), or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM geocache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.stale_seconds <= time.time():
+                return None
+            self._stats["stale_hits"] += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        """Store value under key in both cache levels"""
+        if ttl_seconds is None:
+            ttl_seconds = self.ttl_seconds
+        expires_at = time.time() + ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._stats["writes"] += 1
+
+    def set_negative(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a "not found" result with the shorter negative TTL"""
+        self.set(key, value, ttl_seconds=self.negative_ttl_seconds)
+
+    def purge_expired(self) -> int:
+        """Delete entries past their stale window from disk and return how many were removed"""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (exp, _) in self._memory.items() if exp <= now]:
+                del self._memory[key]
+            cursor = self._conn.execute("DELETE FROM geocache WHERE expires_at <= ?", (now - self.stale_seconds,))
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM geocache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM geocache").fetchone()[0]
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A probe returns (healthy, detail); detail is reported as-is by /health
+Probe = Callable[[], Awaitable[Tuple[bool, Any]]]
+
+
+class HealthMonitor:
+    """Probes dependencies in the background and caches the latest result.
+
+    Each probe runs every `interval` seconds while healthy. After a failure the
+    delay doubles up to `max_interval`, so a dead dependency is not hammered,
+    and drops back to `interval` as soon as a probe succeeds again.
+    """
+
+    def __init__(self):
+        self._probes: Dict[str, Dict[str, Any]] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._rechecks: Dict[str, asyncio.Task] = {}
+
+    def register(self, name: str, probe: Probe, interval: float = 30.0,
+                 max_interval: float = 300.0, timeout: float = 10.0) -> None:
+        self._probes[name] = {"probe": probe, "interval": interval, "max_interval": max_interval, "timeout": timeout}
+        self._status[name] = {
+            "healthy": None,  # None until the first probe finishes
+            "detail": "not checked yet",
+            "checked_at": None,
+            "consecutive_failures": 0,
+        }
+
+    async def start(self) -> None:
+        """Start one background probing task per dependency (the first probe runs immediately)"""
+        for name in self._probes:
+            self._tasks.append(asyncio.create_task(self._run(name)))
+        logger.info(f"Health monitor started for: {', '.join(self._probes)}")
+
+    async def stop(self) -> None:
+        tasks = self._tasks + list(self._rechecks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._rechecks = {}
+
+    async def check_now(self, name: str) -> Dict[str, Any]:
+        """Run one probe immediately and record its result"""
+        config = self._probes[name]
+        try:
+            healthy, detail = await asyncio.wait_for(config["probe"](), timeout=config["timeout"])
+        except asyncio.TimeoutError:
+            healthy, detail = False, f"probe timed out after {config['timeout']:g}s"
+        except Exception as e:
+            healthy, detail = False, str(e)
+
+        status = self._status[name]
+        was_healthy = status["healthy"]
+        status["healthy"] = healthy
+        status["detail"] = detail
+        status["checked_at"] = time.time()
+        status["consecutive_failures"] = 0 if healthy else status["consecutive_failures"] + 1
+        if healthy != was_healthy:
+            log = logger.info if healthy else logger.warning
+            log(f"Health of {name} changed to {'healthy' if healthy else 'unhealthy'}: {detail}")
+        return status
+
+    def status(self, name: str) -> Dict[str, Any]:
+        return dict(self._status[name])
+
+    def is_down(self, name: str) -> bool:
+        """True only when the last probe failed within the probe's base interval (unknown counts as up).
+
+        Probes back off up to max_interval while a dependency is down, so an older
+        failure is not trusted: the caller is let through as a trial and the
+        dependency is re-probed right away, so a recovery is noticed quickly.
+        """
+        status = self._status[name]
+        if status["healthy"] is not False:
+            return False
+        if time.time() - status["checked_at"] < self._probes[name]["interval"]:
+            return True
+        recheck = self._rechecks.get(name)
+        if recheck is None or recheck.done():
+            self._rechecks[name] = asyncio.get_running_loop().create_task(self.check_now(name))
+        return False
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(status) for name, status in self._status.items()}
+
+    async def _run(self, name: str) -> None:
+        config = self._probes[name]
+        while True:
+            await self.check_now(name)
+            failures = self._status[name]["consecutive_failures"]
+            delay = min(config["interval"] * (2 ** min(failures, 16)), config["max_interval"])
+            # Jitter keeps multiple workers from probing in lockstep
+            await asyncio.sleep(delay * random.uniform(0.9, 1.1))
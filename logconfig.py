@@ -0,0 +1,119 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Dict, List, Optional
+
+# Set per request (by middleware) and stamped onto every record logged while handling it
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_mapping(spec: str) -> Dict[str, str]:
+    """'main.payload=0.1,httpx=WARNING' -> {"main.payload": "0.1", "httpx": "WARNING"}"""
+    mapping = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of the records from chosen loggers (and their children).
+
+    Rates map a logger name prefix to the fraction of records kept; the longest
+    matching prefix wins. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Longest prefix first
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1 or random.random() < rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request ID and any `extra` fields"""
+
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = "INFO", log_file: Optional[str] = "app.log", fmt: str = "text",
+                      levels: Optional[Dict[str, str]] = None, sample_rates: Optional[Dict[str, float]] = None) -> None:
+    """Route all logging through a queue so handlers write on a background thread.
+
+    Request threads only filter the record and put it on the queue; formatting
+    and the console/file writes happen in the QueueListener's thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
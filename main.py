@@ -1,27 +1,53 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import requests
+import httpx
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Annotated, Literal
 import ollama
-import urllib.parse
+import asyncio
 import logging
 import traceback
-import sys
-
-# Configure detailed logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('app.log')
-    ]
-)
+import os
+import time
+import uuid
+
+from geocache import GeoCache
+from upstream import UpstreamClient, UpstreamUnavailableError
+from ratelimit import OutboundScheduler, SharedTokenBucket, PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND
+from routing import RoadGraph, haversine_m, haversine_matrix_m, init_route_worker, route_in_worker
+import numpy as np
+from spatial import PlaceIndex, KM_PER_DEGREE_LAT
+from health import HealthMonitor
+from respcache import ResponseCache
+from gazetteer import Gazetteer
+from registry import ToolRegistry, ToolError
+from records import Place, llm_view, dumps
+from sessions import SessionStore, compact_messages
+from admission import AdmissionController, OverloadedError, SharedSlots
+from logconfig import configure_logging, parse_mapping, request_id_var
+import metrics
+from metrics import span
+import math
+
+# Logging: records are queued and written on a background thread.
+# LOG_LEVELS sets per-logger levels and LOG_SAMPLE keeps a fraction of a logger's
+# records, e.g. LOG_LEVELS="main.payload=DEBUG" LOG_SAMPLE="main.payload=0.05"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "text" or "json"
+LOG_FILE = os.environ.get("LOG_FILE", "app.log")  # empty disables the file
+LOG_LEVELS = parse_mapping(os.environ.get("LOG_LEVELS", ""))
+LOG_SAMPLE = {name: float(rate) for name, rate in parse_mapping(os.environ.get("LOG_SAMPLE", "")).items()}
+
+configure_logging(level=LOG_LEVEL, log_file=LOG_FILE, fmt=LOG_FORMAT, levels=LOG_LEVELS, sample_rates=LOG_SAMPLE)
 
-# Create logger for this module
-logger = logging.getLogger(__name__)
+# Create logger for this module. Fixed names, not __name__: under `python main.py`
+# that is "__main__", and LOG_LEVELS/LOG_SAMPLE keys would silently not match
+logger = logging.getLogger("main")
+# Full payload dumps (tool calls/results, LLM messages) go here, so they can be
+# enabled and sampled separately; lazy %-formatting keeps them free when disabled
+payload_logger = logging.getLogger("main.payload")
 
 app = FastAPI(title="Maps LLM Tool Calling API - OpenStreetMap")
 
@@ -31,31 +57,337 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Retry-After"],
 )
 
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag every log record of a request with its ID (taken from X-Request-ID or generated)"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    try:
+        with metrics.request_span(f"{request.method} {request.url.path}", request_id=request_id):
+            response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 OLLAMA_MODEL = "qwen2.5:14b"
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST")  # None uses the ollama library default
+# How long Ollama keeps the model (and its KV cache for the last prompt) loaded between requests
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+NOMINATIM_HEADERS = {"User-Agent": "MapsAI/1.0"}  # Required by Nominatim
+HTTP_TIMEOUT = 10.0
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "20"))
+
+# Nominatim usage policy allows roughly one request per second
+NOMINATIM_RATE_LIMIT = float(os.environ.get("NOMINATIM_RATE_LIMIT", "1.0"))
+NOMINATIM_BURST = float(os.environ.get("NOMINATIM_BURST", "1"))
+NOMINATIM_MAX_QUEUE = int(os.environ.get("NOMINATIM_MAX_QUEUE", "100"))
+# Resilience: per-attempt timeout, retries on timeouts/5xx (with jittered backoff) and a
+# circuit breaker that fails fast (serving stale cache entries) after repeated failures
+NOMINATIM_TIMEOUT = float(os.environ.get("NOMINATIM_TIMEOUT", "4"))
+NOMINATIM_RETRIES = int(os.environ.get("NOMINATIM_RETRIES", "2"))
+NOMINATIM_BREAKER_FAILURES = int(os.environ.get("NOMINATIM_BREAKER_FAILURES", "5"))
+NOMINATIM_BREAKER_RESET = float(os.environ.get("NOMINATIM_BREAKER_RESET", "30"))
+# Optional secondary geocoder with a Nominatim-compatible /search (e.g. a self-hosted
+# instance): used when the primary fails, and raced against it once the primary has
+# been slower than NOMINATIM_HEDGE_DELAY seconds (empty = failover only)
+NOMINATIM_SECONDARY_URL = os.environ.get("NOMINATIM_SECONDARY_URL")
+NOMINATIM_HEDGE_DELAY = os.environ.get("NOMINATIM_HEDGE_DELAY", "1.0")
+
+# Offline routing: a graph built with `python routing.py extract.osm.pbf graph.npz`
+# (an .osm/.pbf path also works but is parsed at startup). Unset = haversine estimates.
+ROUTING_GRAPH_PATH = os.environ.get("ROUTING_GRAPH_PATH")
+ROUTING_MAX_SNAP_KM = float(os.environ.get("ROUTING_MAX_SNAP_KM", "2"))
+# Route searches are CPU-bound: >0 runs them in that many worker processes instead of a thread
+ROUTING_WORKERS = int(os.environ.get("ROUTING_WORKERS", "0"))
+
+# Nearby search: POIs from an OSM extract (or an index built with `python spatial.py`),
+# plus every place returned by search_places
+POI_INDEX_PATH = os.environ.get("POI_INDEX_PATH")
+POI_INDEX_CELL_DEG = float(os.environ.get("POI_INDEX_CELL_DEG", "0.01"))
+POI_INDEX_MAX_PLACES = int(os.environ.get("POI_INDEX_MAX_PLACES", "1000000"))
+
+# Background health probes (seconds); failures back off exponentially up to the max
+HEALTH_OLLAMA_INTERVAL = float(os.environ.get("HEALTH_OLLAMA_INTERVAL", "15"))
+HEALTH_NOMINATIM_INTERVAL = float(os.environ.get("HEALTH_NOMINATIM_INTERVAL", "300"))
+HEALTH_MAX_INTERVAL = float(os.environ.get("HEALTH_MAX_INTERVAL", "600"))
+
+# Response cache: identical conversations skip LLM inference entirely. Setting an
+# embedding model (e.g. "nomic-embed-text") also matches near-identical questions.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_EMBED_MODEL = os.environ.get("RESPONSE_CACHE_EMBED_MODEL")
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+# Fast path: "on" answers from tool result templates instead of a second LLM round
+# whenever every tool called this turn has a renderer and succeeded
+FAST_PATH_MODE = os.environ.get("FAST_PATH_MODE", "off")
+
+# OpenTelemetry trace export (needs opentelemetry-sdk and opentelemetry-exporter-otlp),
+# e.g. http://localhost:4318 for a local collector; unset disables tracing
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+# Places per tool result sent back to the model (map_data always has all of them)
+LLM_MAX_PLACES = int(os.environ.get("LLM_MAX_PLACES", "10"))
+
+# Server-side chat sessions: histories above SESSION_TOKEN_BUDGET (estimated tokens)
+# are compacted, keeping the last SESSION_KEEP_TURNS turns verbatim
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", str(6 * 3600)))
+SESSION_TOKEN_BUDGET = int(os.environ.get("SESSION_TOKEN_BUDGET", "2048"))
+SESSION_KEEP_TURNS = int(os.environ.get("SESSION_KEEP_TURNS", "2"))
+
+# Worker processes for `python main.py` (uvicorn reads the same variable). With more
+# than one, sessions and the Nominatim rate limit move to a SQLite file all workers share
+# (the geocode cache is always shared through GEOCODE_CACHE_PATH)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+SHARED_STATE_PATH = os.environ.get("SHARED_STATE_PATH", "shared_state.sqlite3" if WEB_CONCURRENCY > 1 else "")
+
+# Admission control: LLM calls beyond LLM_MAX_IN_FLIGHT (a cap shared by all
+# workers) wait in a queue (LLM_MAX_QUEUE, split across workers) for up to
+# LLM_QUEUE_TIMEOUT seconds; when the queue is full or the wait runs out the request
+# gets 429 with a Retry-After header
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "2"))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "20"))
+
+# Straight-line travel estimates when no road graph route is available
+ESTIMATED_SPEEDS_KMH = {
+    "driving": 50,   # ~50 km/h average
+    "walking": 5,    # ~5 km/h
+    "bicycling": 15, # ~15 km/h
+}
+
+# Bulk endpoints: inputs per request, and concurrent lookups per request
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "50000"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+
+# Tool calls from one LLM turn run concurrently, bounded by these limits
+TOOL_CONCURRENCY = int(os.environ.get("TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.environ.get("TOOL_TIMEOUT", "15"))
+TOOL_THREAD_WORKERS = int(os.environ.get("TOOL_THREAD_WORKERS", "8"))
+
+# Agent loop: rounds of tool calls per request, and the wall-clock budget (seconds)
+# for all of them. Past either limit the model must answer with what it has.
+AGENT_MAX_STEPS = int(os.environ.get("AGENT_MAX_STEPS", "4"))
+AGENT_DEADLINE = float(os.environ.get("AGENT_DEADLINE", "45"))
+
+# Geocoder backend: "nominatim" (default), "local" (offline gazetteer only) or
+# "local_first" (gazetteer, falling back to Nominatim on a miss).
+# Build the gazetteer with `python gazetteer.py extract.osm.pbf gazetteer/`.
+GEOCODER_BACKEND = os.environ.get("GEOCODER_BACKEND", "nominatim")
+GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH", "gazetteer")
+
+# Geocoding cache (in-memory LRU backed by SQLite, survives restarts)
+GEOCODE_CACHE_PATH = os.environ.get("GEOCODE_CACHE_PATH", "geocode_cache.sqlite3")
+GEOCODE_CACHE_MEMORY_ENTRIES = int(os.environ.get("GEOCODE_CACHE_MEMORY_ENTRIES", "1024"))
+GEOCODE_CACHE_TTL = float(os.environ.get("GEOCODE_CACHE_TTL", str(7 * 24 * 3600)))
+GEOCODE_CACHE_NEGATIVE_TTL = float(os.environ.get("GEOCODE_CACHE_NEGATIVE_TTL", "3600"))
+# Expired entries are kept this much longer as a fallback while Nominatim is unavailable
+GEOCODE_CACHE_STALE_TTL = float(os.environ.get("GEOCODE_CACHE_STALE_TTL", str(30 * 24 * 3600)))
+
+geocode_cache = GeoCache(
+    path=GEOCODE_CACHE_PATH,
+    max_memory_entries=GEOCODE_CACHE_MEMORY_ENTRIES,
+    ttl_seconds=GEOCODE_CACHE_TTL,
+    negative_ttl_seconds=GEOCODE_CACHE_NEGATIVE_TTL,
+    stale_seconds=GEOCODE_CACHE_STALE_TTL,
+)
+
+# Async clients shared by all requests on the event loop
+ollama_client = ollama.AsyncClient(host=OLLAMA_HOST)
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the pooled HTTP client for the running event loop, creating it on first use"""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        logger.debug("Creating shared HTTP client")
+        _http_client = httpx.AsyncClient(
+            headers=NOMINATIM_HEADERS,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS
+            )
+        )
+        _http_client_loop = loop
+    return _http_client
+
+async def close_http_client():
+    """Close the shared HTTP client (called on shutdown and after sync wrapper calls)"""
+    global _http_client, _http_client_loop
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+    _http_client_loop = None
+
+def _run_sync(func, *args, **kwargs):
+    """Run an async tool function to completion from synchronous code"""
+    async def runner():
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            await close_http_client()
+    return asyncio.run(runner())
+
+nominatim_scheduler = OutboundScheduler(
+    rate_per_second=NOMINATIM_RATE_LIMIT,
+    burst=NOMINATIM_BURST,
+    max_queue_size=NOMINATIM_MAX_QUEUE,
+    bucket=SharedTokenBucket(SHARED_STATE_PATH, "nominatim", NOMINATIM_RATE_LIMIT, NOMINATIM_BURST) if SHARED_STATE_PATH else None
+)
+
+nominatim_upstream = UpstreamClient(
+    "nominatim",
+    get_http_client,
+    NOMINATIM_URL,
+    secondary_url=NOMINATIM_SECONDARY_URL,
+    retries=NOMINATIM_RETRIES,
+    hedge_delay=float(NOMINATIM_HEDGE_DELAY) if NOMINATIM_HEDGE_DELAY else None,
+    failure_threshold=NOMINATIM_BREAKER_FAILURES,
+    reset_timeout=NOMINATIM_BREAKER_RESET
+)
+
+async def nominatim_search(params: Dict[str, Any], priority: int = PRIORITY_INTERACTIVE,
+                           timeout: float = NOMINATIM_TIMEOUT) -> Any:
+    """Rate-limited GET against Nominatim /search; identical in-flight queries share one request"""
+    key = json.dumps(params, sort_keys=True)
+    
+    async def through_scheduler(send):
+        async def do_request():
+            payload_logger.debug("Making request to Nominatim with params: %s", params)
+            response = await send()
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After", "")
+                nominatim_scheduler.pause(float(retry_after) if retry_after.isdigit() else 5.0)
+            return response
+        return await nominatim_scheduler.submit(key, do_request, priority=priority)
+    
+    return await nominatim_upstream.get_json("/search", params, timeout, gate=through_scheduler)
+
+async def stale_geocode(cache_key: str, error: Exception) -> Optional[Any]:
+    """Expired cache entry to serve while Nominatim is failing, or None"""
+    stale = await asyncio.to_thread(geocode_cache.get_stale, cache_key)
+    if stale is not None:
+        logger.warning(f"Nominatim unavailable ({type(error).__name__}), serving stale cache entry for '{cache_key}'")
+    return stale
+
+async def embed_text(text: str) -> List[float]:
+    """Embed text with the local Ollama embedding model"""
+    with span("embed"):
+        response = await ollama_client.embed(model=RESPONSE_CACHE_EMBED_MODEL, input=text)
+    return response.embeddings[0]
+
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESPONSE_CACHE_TTL,
+    similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+    embed_fn=embed_text if RESPONSE_CACHE_EMBED_MODEL else None
+) if RESPONSE_CACHE_ENABLED else None
+
+session_store = SessionStore(
+    max_sessions=SESSION_MAX,
+    ttl_seconds=SESSION_TTL,
+    token_budget=SESSION_TOKEN_BUDGET,
+    keep_recent_turns=SESSION_KEEP_TURNS,
+    path=SHARED_STATE_PATH or None
+)
+
+llm_admission = AdmissionController(
+    max_in_flight=LLM_MAX_IN_FLIGHT,
+    max_queue=max(1, math.ceil(LLM_MAX_QUEUE / WEB_CONCURRENCY)),
+    queue_timeout=LLM_QUEUE_TIMEOUT,
+    # With several workers each may use any free slot, but never more than LLM_MAX_IN_FLIGHT in total
+    shared_slots=SharedSlots(f"{SHARED_STATE_PATH}.llm-slot", LLM_MAX_IN_FLIGHT) if SHARED_STATE_PATH else None
+)
+
+# Every LLM tool is registered here; schemas and dispatch are derived from it
+tool_registry = ToolRegistry(
+    thread_workers=TOOL_THREAD_WORKERS,
+    process_workers=ROUTING_WORKERS if ROUTING_GRAPH_PATH else 0,
+    process_initializer=init_route_worker,
+    process_initargs=(ROUTING_GRAPH_PATH,)
+)
+
+road_graph: Optional[RoadGraph] = None
+gazetteer: Optional[Gazetteer] = None
+place_index = PlaceIndex(cell_deg=POI_INDEX_CELL_DEG, max_places=POI_INDEX_MAX_PLACES)
+
+class BatchGeocodeRequest(BaseModel):
+    addresses: List[str]
+
+class DistanceMatrixRequest(BaseModel):
+    origins: List[str]
+    destinations: List[str]
+    mode: str = "driving"
 
 class ChatRequest(BaseModel):
     message: str
     conversation_history: Optional[List[Dict[str, str]]] = []
+    # Continue a server-side session; conversation_history is then ignored
+    # (it only seeds a session the server does not know yet)
+    session_id: Optional[str] = None
+    # False leaves tool results out of tool_calls (they are already in map_data)
+    include_tool_calls: bool = True
 
 class ChatResponse(BaseModel):
     response: str
     tool_calls: Optional[List[Dict[str, Any]]] = None
     map_data: Optional[Dict[str, Any]] = None
+    cached: Optional[str] = None  # "exact" or "semantic" when served from the response cache
+    response_path: Optional[str] = None  # "direct", "llm", "template" or "cache"
+    session_id: Optional[str] = None  # pass back to continue the conversation
 
 # OpenStreetMap API functions (all free, no API key needed!)
-def search_places(query: str, location: str = "") -> Dict[str, Any]:
+def places_from_nominatim(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Shape raw Nominatim search results into place dicts"""
+    places = []
+    for item in data:
+        place = Place.from_nominatim(item).for_map()
+        places.append(place)
+        payload_logger.debug("Processed place: %s at %s", place['name'], place['coordinates'])
+    return places
+
+@tool_registry.tool(
+    name="search_places",
+    description="Search for places like restaurants, hotels, attractions, etc. using OpenStreetMap data",
+    timeout=TOOL_TIMEOUT
+)
+async def search_places_async(
+    query: Annotated[str, "What to search for (e.g., 'pizza restaurants', 'gas stations', 'hotels')"],
+    location: Annotated[str, "Location to search in (city, address, etc.)"] = ""
+) -> Dict[str, Any]:
     """Search for places using Nominatim (OpenStreetMap)"""
     try:
         logger.info(f"Searching places: query='{query}', location='{location}'")
         
         # Combine query and location
         search_query = f"{query} {location}".strip()
-        logger.debug(f"Combined search query: '{search_query}'")
+        logger.debug("Combined search query: '%s'", search_query)
+        
+        if gazetteer is not None:
+            matches = await asyncio.to_thread(gazetteer.lookup, search_query, 5)
+            if matches or GEOCODER_BACKEND == "local":
+                logger.info(f"Local gazetteer search completed: {len(matches)} places found")
+                return {"status": "success", "places": matches, "source": "local"}
+        
+        cache_key = GeoCache.make_key("search", search_query, limit=5)
+        cached = await asyncio.to_thread(geocode_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"Search cache hit for '{search_query}'")
+            return cached
         
         # Use Nominatim API (free OpenStreetMap geocoding)
-        url = "https://nominatim.openstreetmap.org/search"
         params = {
             "q": search_query,
             "format": "json",
@@ -64,37 +396,27 @@ def search_places(query: str, location: str = "") -> Dict[str, Any]:
             "extratags": 1
         }
         
-        headers = {
-            "User-Agent": "MapsAI/1.0"  # Required by Nominatim
-        }
-        
-        logger.debug(f"Making request to Nominatim: {url} with params: {params}")
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise exception for bad status codes
-        
-        data = response.json()
-        logger.debug(f"Nominatim response: {len(data)} results")
+        try:
+            data = await nominatim_search(params)
+        except (httpx.HTTPError, UpstreamUnavailableError) as e:
+            stale = await stale_geocode(cache_key, e)
+            if stale is None:
+                raise
+            return dict(stale, stale=True)
+        logger.debug("Nominatim response: %d results", len(data))
         
-        places = []
-        for item in data:
-            place = {
-                "name": item.get("display_name", "").split(",")[0],
-                "address": item.get("display_name"),
-                "coordinates": {
-                    "lat": float(item.get("lat", 0)),
-                    "lng": float(item.get("lon", 0))
-                },
-                "type": item.get("type", ""),
-                "importance": item.get("importance", 0)
-            }
-            places.append(place)
-            logger.debug(f"Processed place: {place['name']} at {place['coordinates']}")
+        places = places_from_nominatim(data)
+        place_index.add_many(places)
         
         result = {"status": "success", "places": places}
+        if places:
+            await asyncio.to_thread(geocode_cache.set, cache_key, result)
+        else:
+            await asyncio.to_thread(geocode_cache.set_negative, cache_key, result)
         logger.info(f"Search completed successfully: {len(places)} places found")
         return result
     
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, UpstreamUnavailableError) as e:
         logger.error(f"Network error in search_places: {str(e)}")
         return {"status": "error", "message": f"Network error: {str(e)}"}
     except Exception as e:
@@ -102,59 +424,85 @@ def search_places(query: str, location: str = "") -> Dict[str, Any]:
         logger.error(f"Traceback: {traceback.format_exc()}")
         return {"status": "error", "message": str(e)}
 
-def get_directions(origin: str, destination: str, mode: str = "driving") -> Dict[str, Any]:
+@tool_registry.tool(
+    name="get_directions",
+    description="Get basic directions and distance between two locations",
+    timeout=TOOL_TIMEOUT
+)
+async def get_directions_async(
+    origin: Annotated[str, "Starting location (address or place name)"],
+    destination: Annotated[str, "Destination location (address or place name)"],
+    mode: Annotated[Literal["driving", "walking", "bicycling"], "Transportation mode"] = "driving"
+) -> Dict[str, Any]:
     """Get directions using OpenRouteService (free with registration)"""
     try:
         logger.info(f"Getting directions: {origin} -> {destination} ({mode})")
         
-        # First geocode the addresses
-        logger.debug("Geocoding origin address")
-        origin_coords = geocode_address(origin)
-        logger.debug("Geocoding destination address")
-        dest_coords = geocode_address(destination)
+        # First geocode both addresses concurrently
+        logger.debug("Geocoding origin and destination addresses")
+        origin_coords, dest_coords = await asyncio.gather(
+            geocode_address_async(origin),
+            geocode_address_async(destination)
+        )
         
         if origin_coords["status"] != "success" or dest_coords["status"] != "success":
             error_msg = "Could not find one or both locations"
             logger.warning(f"Geocoding failed: {error_msg}")
             return {"status": "error", "message": error_msg}
         
-        # For simplicity, we'll return basic info without detailed routing
-        # You can integrate with OpenRouteService API for detailed routing
         origin_coord = origin_coords["coordinates"]
         dest_coord = dest_coords["coordinates"]
         
-        logger.debug(f"Origin coords: {origin_coord}")
-        logger.debug(f"Destination coords: {dest_coord}")
+        logger.debug("Origin coords: %s", origin_coord)
+        logger.debug("Destination coords: %s", dest_coord)
+        
+        # Prefer the local road graph when both points fall inside the loaded extract
+        route = None
+        if road_graph is not None and mode in road_graph.profiles:
+            # Keep the CPU-bound search off the event loop
+            if tool_registry.process_workers > 0:
+                route = await tool_registry.run_in_pool("process", route_in_worker, origin_coord, dest_coord, mode)
+            else:
+                route = await tool_registry.run_in_pool("thread", road_graph.route, origin_coord, dest_coord, mode)
+            if route is None:
+                logger.warning(f"No {mode} route found in road graph, falling back to estimate")
+            elif route["snap_distance_m"] > ROUTING_MAX_SNAP_KM * 1000:
+                logger.warning(f"Locations are {route['snap_distance_m']:.0f} m from the road graph, falling back to estimate")
+                route = None
+        
+        if route is not None:
+            distance_km = route["distance_m"] / 1000
+            estimated_hours = route["duration_s"] / 3600
+            logger.debug("Routed distance: %s km, time: %s hours", distance_km, estimated_hours)
+            
+            result = {
+                "status": "success",
+                "distance": f"{distance_km:.1f} km",
+                "duration": f"{estimated_hours*60:.0f} minutes" if estimated_hours < 1 else f"{estimated_hours:.1f} hours",
+                "start_address": origin,
+                "end_address": destination,
+                "coordinates": {
+                    "origin": origin_coord,
+                    "destination": dest_coord
+                },
+                "polyline": route["polyline"],
+                "routing": "road_graph",
+                "mode": mode
+            }
+            logger.info(f"Route calculated successfully: {result['distance']}, {result['duration']}")
+            return result
         
         # Calculate rough distance (this is simplified)
-        import math
-        
-        def haversine_distance(lat1, lon1, lat2, lon2):
-            R = 6371  # Earth's radius in kilometers
-            dlat = math.radians(lat2 - lat1)
-            dlon = math.radians(lon2 - lon1)
-            a = (math.sin(dlat/2)**2 + 
-                 math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * 
-                 math.sin(dlon/2)**2)
-            c = 2 * math.asin(math.sqrt(a))
-            return R * c
-        
-        distance_km = haversine_distance(
+        distance_km = float(haversine_m(
             origin_coord["lat"], origin_coord["lng"],
             dest_coord["lat"], dest_coord["lng"]
-        )
+        )) / 1000
         
-        logger.debug(f"Calculated distance: {distance_km} km")
+        logger.debug("Calculated distance: %s km", distance_km)
         
-        # Rough time estimates based on mode
-        time_estimates = {
-            "driving": distance_km / 50,  # ~50 km/h average
-            "walking": distance_km / 5,   # ~5 km/h
-            "bicycling": distance_km / 15, # ~15 km/h
-        }
-        
-        estimated_hours = time_estimates.get(mode, distance_km / 50)
-        logger.debug(f"Estimated time: {estimated_hours} hours")
+        # Rough time estimate based on mode
+        estimated_hours = distance_km / ESTIMATED_SPEEDS_KMH.get(mode, ESTIMATED_SPEEDS_KMH["driving"])
+        logger.debug("Estimated time: %s hours", estimated_hours)
         
         result = {
             "status": "success",
@@ -166,6 +514,8 @@ def get_directions(origin: str, destination: str, mode: str = "driving") -> Dict
                 "origin": origin_coord,
                 "destination": dest_coord
             },
+            "polyline": [[origin_coord["lat"], origin_coord["lng"]], [dest_coord["lat"], dest_coord["lng"]]],
+            "routing": "estimate",
             "mode": mode
         }
         
@@ -177,12 +527,41 @@ def get_directions(origin: str, destination: str, mode: str = "driving") -> Dict
         logger.error(f"Traceback: {traceback.format_exc()}")
         return {"status": "error", "message": str(e)}
 
-def geocode_address(address: str) -> Dict[str, Any]:
+@tool_registry.tool(
+    name="geocode_address",
+    description="Convert an address to coordinates (latitude/longitude)",
+    timeout=TOOL_TIMEOUT
+)
+async def geocode_address_async(
+    address: Annotated[str, "Address to convert to coordinates"],
+    *,
+    priority: int = PRIORITY_INTERACTIVE
+) -> Dict[str, Any]:
     """Convert address to coordinates using Nominatim"""
     try:
         logger.info(f"Geocoding address: '{address}'")
         
-        url = "https://nominatim.openstreetmap.org/search"
+        if gazetteer is not None:
+            matches = await asyncio.to_thread(gazetteer.lookup, address, 1)
+            if matches:
+                result = {
+                    "status": "success",
+                    "address": matches[0]["address"],
+                    "coordinates": matches[0]["coordinates"],
+                    "source": "local"
+                }
+                logger.info(f"Local geocoding successful: {result['coordinates']}")
+                return result
+            if GEOCODER_BACKEND == "local":
+                logger.warning(f"No local geocoding results found for: {address}")
+                return {"status": "error", "message": "Address not found"}
+        
+        cache_key = GeoCache.make_key("geocode", address, limit=1)
+        cached = await asyncio.to_thread(geocode_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"Geocode cache hit for '{address}'")
+            return cached
+        
         params = {
             "q": address,
             "format": "json",
@@ -190,16 +569,14 @@ def geocode_address(address: str) -> Dict[str, Any]:
             "addressdetails": 1
         }
         
-        headers = {
-            "User-Agent": "MapsAI/1.0"
-        }
-        
-        logger.debug(f"Making geocoding request to: {url}")
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        logger.debug(f"Geocoding response: {len(data)} results")
+        try:
+            data = await nominatim_search(params, priority=priority)
+        except (httpx.HTTPError, UpstreamUnavailableError) as e:
+            stale = await stale_geocode(cache_key, e)
+            if stale is None:
+                raise
+            return dict(stale, stale=True)
+        logger.debug("Geocoding response: %d results", len(data))
         
         if data:
             result_data = data[0]
@@ -211,13 +588,16 @@ def geocode_address(address: str) -> Dict[str, Any]:
                     "lng": float(result_data.get("lon", 0))
                 }
             }
+            await asyncio.to_thread(geocode_cache.set, cache_key, result)
             logger.info(f"Geocoding successful: {result['coordinates']}")
             return result
         else:
             logger.warning(f"No geocoding results found for: {address}")
-            return {"status": "error", "message": "Address not found"}
+            result = {"status": "error", "message": "Address not found"}
+            await asyncio.to_thread(geocode_cache.set_negative, cache_key, result)
+            return result
     
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, UpstreamUnavailableError) as e:
         logger.error(f"Network error in geocode_address: {str(e)}")
         return {"status": "error", "message": f"Network error: {str(e)}"}
     except Exception as e:
@@ -225,103 +605,172 @@ def geocode_address(address: str) -> Dict[str, Any]:
         logger.error(f"Traceback: {traceback.format_exc()}")
         return {"status": "error", "message": str(e)}
 
-def find_nearby_places(lat: float, lng: float, place_type: str, radius_km: float = 5) -> Dict[str, Any]:
-    """Find places near coordinates using Overpass API"""
+@tool_registry.tool(
+    name="find_nearby_places",
+    description="Find places of a given type (e.g. cafe, pharmacy, hotel) within a radius of coordinates, nearest first. Use geocode_address first if you only have an address.",
+    timeout=TOOL_TIMEOUT,
+    max_concurrency=8
+)
+async def find_nearby_places_async(
+    lat: Annotated[float, "Latitude of the center point"],
+    lng: Annotated[float, "Longitude of the center point"],
+    place_type: Annotated[str, "Kind of place to look for (e.g. 'cafe', 'restaurant', 'pharmacy')"],
+    radius_km: Annotated[float, "Search radius in kilometers (default 5)"] = 5
+) -> Dict[str, Any]:
+    """Find places of a given type within radius_km of coordinates using the local spatial index"""
     try:
         logger.info(f"Finding nearby places: {place_type} near {lat},{lng} within {radius_km}km")
         
-        # Overpass API query for nearby places
-        # This is more complex but very powerful - simplified version here
+        places = place_index.query_radius(lat, lng, radius_km, place_type, limit=10)
+        source = "local_index"
+        
+        # Offline-only deployments answer from the index even when it has nothing here
+        if not places and GEOCODER_BACKEND != "local":
+            # Nothing indexed here yet: ask Nominatim for this type inside the bounding box,
+            # then answer from the index so results are filtered by true distance
+            dlat = radius_km / KM_PER_DEGREE_LAT
+            dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+            params = {
+                "q": place_type,
+                "format": "json",
+                "limit": 40,
+                "viewbox": f"{lng - dlng:.5f},{lat + dlat:.5f},{lng + dlng:.5f},{lat - dlat:.5f}",
+                "bounded": 1
+            }
+            cache_key = GeoCache.make_key("nearby", place_type, viewbox=params["viewbox"])
+            data = await asyncio.to_thread(geocode_cache.get, cache_key)
+            if data is None:
+                try:
+                    data = await nominatim_search(params)
+                except (httpx.HTTPError, UpstreamUnavailableError) as e:
+                    data = await stale_geocode(cache_key, e)
+                    if data is None:
+                        raise
+                else:
+                    if data:
+                        await asyncio.to_thread(geocode_cache.set, cache_key, data)
+                    else:
+                        await asyncio.to_thread(geocode_cache.set_negative, cache_key, data)
+            
+            remote = places_from_nominatim(data)
+            place_index.add_many(remote)
+            places = place_index.query_radius(lat, lng, radius_km, place_type, limit=10)
+            if not places:
+                # Nominatim's type may not match the requested wording; keep its matches
+                places = place_index.query_radius(lat, lng, radius_km, limit=10)
+                names = {place["name"] for place in remote}
+                places = [place for place in places if place["name"] in names]
+            source = "nominatim"
         
-        # For simplicity, we'll use a basic search around coordinates
-        search_query = f"{place_type} near {lat},{lng}"
-        return search_places(search_query)
+        logger.info(f"Nearby search found {len(places)} places (source: {source})")
+        return {
+            "status": "success",
+            "places": places,
+            "center": {"lat": lat, "lng": lng},
+            "radius_km": radius_km,
+            "source": source
+        }
     
+    except (httpx.HTTPError, UpstreamUnavailableError) as e:
+        logger.error(f"Network error in find_nearby_places: {str(e)}")
+        return {"status": "error", "message": f"Network error: {str(e)}"}
     except Exception as e:
         logger.error(f"Error in find_nearby_places: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return {"status": "error", "message": str(e)}
 
-# Tool definitions
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "search_places",
-            "description": "Search for places like restaurants, hotels, attractions, etc. using OpenStreetMap data",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "What to search for (e.g., 'pizza restaurants', 'gas stations', 'hotels')"
-                    },
-                    "location": {
-                        "type": "string",
-                        "description": "Location to search in (city, address, etc.)"
-                    }
-                },
-                "required": ["query"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_directions",
-            "description": "Get basic directions and distance between two locations",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "origin": {
-                        "type": "string",
-                        "description": "Starting location (address or place name)"
-                    },
-                    "destination": {
-                        "type": "string",
-                        "description": "Destination location (address or place name)"
-                    },
-                    "mode": {
-                        "type": "string",
-                        "enum": ["driving", "walking", "bicycling"],
-                        "description": "Transportation mode"
-                    }
-                },
-                "required": ["origin", "destination"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "geocode_address",
-            "description": "Convert an address to coordinates (latitude/longitude)",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "address": {
-                        "type": "string",
-                        "description": "Address to convert to coordinates"
-                    }
-                },
-                "required": ["address"]
-            }
-        }
-    }
-]
+# Synchronous wrappers for scripts and notebooks
+def search_places(query: str, location: str = "") -> Dict[str, Any]:
+    """Blocking version of search_places_async"""
+    return _run_sync(search_places_async, query, location)
 
-available_functions = {
-    "search_places": search_places,
-    "get_directions": get_directions,
-    "geocode_address": geocode_address
-}
+def get_directions(origin: str, destination: str, mode: str = "driving") -> Dict[str, Any]:
+    """Blocking version of get_directions_async"""
+    return _run_sync(get_directions_async, origin, destination, mode)
+
+def geocode_address(address: str) -> Dict[str, Any]:
+    """Blocking version of geocode_address_async"""
+    return _run_sync(geocode_address_async, address)
+
+def find_nearby_places(lat: float, lng: float, place_type: str, radius_km: float = 5) -> Dict[str, Any]:
+    """Blocking version of find_nearby_places_async"""
+    return _run_sync(find_nearby_places_async, lat, lng, place_type, radius_km)
+
+# Tool definitions (derived from the registered functions' type hints)
+tools = tool_registry.schemas()
+available_functions = tool_registry.functions()
+
+# Result renderers: deterministic text for a tool result, used by the fast path.
+# A renderer returns None when the result needs the LLM to explain it. Tools whose
+# results are usually an input to further calls (geocoding) are not final: a step
+# made only of them goes back to the model so it can continue the chain.
+result_renderers: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Optional[str]]] = {}
+final_result_tools = set()
+
+def result_renderer(function_name: str, final: bool = True):
+    """Register a renderer for a tool's successful results"""
+    def decorator(func):
+        result_renderers[function_name] = func
+        if final:
+            final_result_tools.add(function_name)
+        return func
+    return decorator
+
+@result_renderer("geocode_address", final=False)
+def render_geocode(arguments: Dict[str, Any], result: Dict[str, Any]) -> Optional[str]:
+    coords = result["coordinates"]
+    return f"{result['address']} is at latitude {coords['lat']:.5f}, longitude {coords['lng']:.5f}."
+
+@result_renderer("get_directions")
+def render_directions(arguments: Dict[str, Any], result: Dict[str, Any]) -> Optional[str]:
+    how = "by road" if result.get("routing") == "road_graph" else "estimated"
+    return (f"{result['mode'].capitalize()} from {result['start_address']} to {result['end_address']} "
+            f"is {result['distance']} ({how}) and takes about {result['duration']}.")
+
+@result_renderer("find_nearby_places")
+def render_nearby(arguments: Dict[str, Any], result: Dict[str, Any]) -> Optional[str]:
+    places = result["places"]
+    if not places:
+        return None
+    lines = [f"- {place['name']} ({place['distance_km']:.1f} km)" for place in places[:5]]
+    return f"Nearest {arguments.get('place_type', 'places')} within {result['radius_km']:g} km:\n" + "\n".join(lines)
+
+def render_tool_results(tool_calls_made: List[Dict[str, Any]]) -> Optional[str]:
+    """Build the answer from tool results alone, or None if any result needs the LLM.
+    
+    Only ends the turn when the latest step called final tools (e.g. nearby search
+    after geocoding); earlier steps' results are rendered along with it.
+    """
+    if FAST_PATH_MODE != "on" or not tool_calls_made:
+        return None
+    last_step = tool_calls_made[-1].get("step")
+    if any(call["function"] not in final_result_tools for call in tool_calls_made if call.get("step") == last_step):
+        return None
+    parts = []
+    for call in tool_calls_made:
+        if call.get("reused"):
+            continue  # already rendered from its first call
+        renderer = result_renderers.get(call["function"])
+        if renderer is None or call["result"].get("status") != "success":
+            return None
+        try:
+            text = renderer(call["arguments"], call["result"])
+        except Exception as e:
+            logger.warning(f"Renderer for {call['function']} failed, using LLM: {str(e)}")
+            return None
+        if text is None:
+            return None
+        parts.append(text)
+    return "\n\n".join(parts)
+
+response_path_counts = {"direct": 0, "llm": 0, "template": 0, "cache": 0}
 
-def check_ollama_connection():
+async def check_ollama_connection():
     """Helper function to safely check Ollama connection and models"""
     try:
         logger.debug("Checking Ollama connection...")
-        models_response = ollama.list()
-        logger.debug(f"Ollama models response: {models_response}")
+        models_response = await ollama_client.list()
+        payload_logger.debug("Ollama models response: %s", models_response)
         
         # Handle different possible response structures
         if isinstance(models_response, dict):
@@ -342,7 +791,7 @@ def check_ollama_connection():
             else:
                 model_names.append(str(model))
         
-        logger.debug(f"Available Ollama models: {model_names}")
+        logger.debug("Available Ollama models: %s", model_names)
         return True, model_names
         
     except Exception as e:
@@ -350,130 +799,422 @@ def check_ollama_connection():
         logger.error(f"Traceback: {traceback.format_exc()}")
         return False, str(e)
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_with_llm(request: ChatRequest):
+async def probe_ollama():
+    """Health probe: Ollama reachable and serving OLLAMA_MODEL"""
+    ollama_ok, ollama_info = await check_ollama_connection()
+    if not ollama_ok:
+        return False, {"status": f"error: {ollama_info}", "available_models": None}
+    # Check if the specific model is available
+    if any(OLLAMA_MODEL in str(model) for model in ollama_info):
+        return True, {"status": "ready", "available_models": ollama_info}
+    return False, {"status": f"model {OLLAMA_MODEL} not found in: {ollama_info}", "available_models": ollama_info}
+
+async def probe_nominatim():
+    """Health probe: one low-priority Nominatim query through the rate limiter"""
     try:
-        logger.info(f"Received chat request: '{request.message[:100]}...' with {len(request.conversation_history)} history messages")
-        
-        messages = []
-        
-        # Build conversation history
-        for i, msg in enumerate(request.conversation_history):
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-            logger.debug(f"History message {i}: {msg['role']} - {msg['content'][:50]}...")
-        
-        # Add current user message
-        messages.append({
-            "role": "user",
-            "content": request.message
-        })
-        
-        logger.debug(f"Sending {len(messages)} messages to Ollama model: {OLLAMA_MODEL}")
-        logger.debug(f"Available tools: {[tool['function']['name'] for tool in tools]}")
-        
-        # Check if Ollama is accessible
-        ollama_ok, ollama_info = check_ollama_connection()
-        if not ollama_ok:
-            logger.error(f"Cannot connect to Ollama: {ollama_info}")
-            raise HTTPException(status_code=503, detail=f"Ollama service unavailable: {ollama_info}")
-        
-        # Make the initial chat request to Ollama
-        logger.debug("Making initial chat request to Ollama...")
-        response = ollama.chat(
-            model=OLLAMA_MODEL,
-            messages=messages,
-            tools=tools
+        # Health probes queue behind interactive traffic and give up after 5s
+        await asyncio.wait_for(
+            nominatim_search({"q": "test", "format": "json", "limit": 1},
+                             priority=PRIORITY_BACKGROUND, timeout=5),
+            timeout=5
         )
+        return True, "ready"
+    except httpx.HTTPStatusError as e:
+        return False, f"error: {e.response.status_code}"
+    except asyncio.TimeoutError:
+        return False, "error: timed out waiting for rate limiter"
+    except Exception as e:
+        return False, f"error: {str(e)}"
+
+def ollama_health() -> Dict[str, Any]:
+    """Latest cached Ollama probe as {"healthy", "status", "available_models", "checked_at"}"""
+    status = health_monitor.status("ollama")
+    detail = status["detail"] if isinstance(status["detail"], dict) else {"status": status["detail"]}
+    return {
+        "healthy": status["healthy"],
+        "status": detail["status"],
+        "available_models": detail.get("available_models"),
+        "checked_at": status["checked_at"]
+    }
+
+def nominatim_health() -> Dict[str, Any]:
+    """Latest cached Nominatim probe, or a placeholder when Nominatim is not used at all"""
+    if GEOCODER_BACKEND == "local":
+        return {"healthy": None, "detail": "disabled (GEOCODER_BACKEND=local)", "checked_at": None}
+    return health_monitor.status("nominatim")
+
+health_monitor = HealthMonitor()
+health_monitor.register("ollama", probe_ollama, interval=HEALTH_OLLAMA_INTERVAL, max_interval=HEALTH_MAX_INTERVAL)
+if GEOCODER_BACKEND != "local":
+    health_monitor.register("nominatim", probe_nominatim, interval=HEALTH_NOMINATIM_INTERVAL, max_interval=HEALTH_MAX_INTERVAL)
+
+# Subsystem counters exported as gauges on /metrics
+metrics.register_stats("geocode_cache", geocode_cache.stats)
+metrics.register_stats("nominatim_scheduler", nominatim_scheduler.stats)
+metrics.register_stats("nominatim_upstream", nominatim_upstream.stats)
+metrics.register_stats("llm_admission", llm_admission.stats)
+metrics.register_stats("sessions", session_store.stats)
+metrics.register_stats("tools", tool_registry.stats)
+metrics.register_stats("response_paths", lambda: dict(response_path_counts))
+metrics.register_stats("healthy", lambda: {name: status["healthy"] is True for name, status in health_monitor.snapshot().items()})
+if response_cache is not None:
+    metrics.register_stats("response_cache", response_cache.stats)
+
+async def execute_tool_call(index: int, tool_call: Dict[str, Any], semaphore: asyncio.Semaphore,
+                            emit: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Execute one tool call with bounded concurrency and a timeout, returning its tool_calls entry.
+    
+    If emit is given it receives tool_start/tool_end events as they happen.
+    """
+    payload_logger.debug("Processing tool call %d: %s", index + 1, tool_call)
+    
+    function_name = tool_call['function']['name']
+    arguments = tool_call['function']['arguments']
+    if emit:
+        emit({"type": "tool_start", "index": index, "function": function_name, "arguments": arguments})
+    
+    async with semaphore:
+        logger.info(f"Executing tool: {function_name} with args: {arguments}")
+        started = time.perf_counter()
+        try:
+            # The registry applies the tool's own execution pool, concurrency cap and timeout
+            function_result = await tool_registry.call(function_name, arguments)
+            payload_logger.debug("Tool %s result: %s", function_name, function_result)
+        except ToolError as e:
+            logger.error(f"Rejected tool call: {str(e)}")
+            function_result = {"status": "error", "message": str(e)}
+        except asyncio.TimeoutError:
+            timeout = tool_registry.get(function_name).timeout
+            logger.error(f"Tool {function_name} timed out after {timeout}s")
+            function_result = {"status": "error", "message": f"Tool timed out after {timeout:g} seconds"}
+        except Exception as e:
+            logger.error(f"Error executing tool {function_name}: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            function_result = {"status": "error", "message": str(e)}
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    metrics.observe_tool(function_name, function_result.get("status", "unknown"), duration_ms / 1000)
+    
+    if emit:
+        emit({"type": "tool_end", "index": index, "function": function_name, "result": function_result})
+    return {
+        "function": function_name,
+        "arguments": arguments,
+        "result": function_result,
+        "duration_ms": duration_ms
+    }
+
+def tool_call_key(tool_call: Dict[str, Any]) -> str:
+    """Identity of a tool call for reusing its result later in the same request"""
+    return json.dumps(
+        {"function": tool_call['function']['name'], "arguments": tool_call['function']['arguments']},
+        sort_keys=True, default=str
+    )
+
+async def run_tool_step(step: int, requested: List[Any], tool_calls_made: List[Dict[str, Any]],
+                        reusable: Dict[str, Dict[str, Any]], started: float, deadline: float) -> AsyncIterator[Dict[str, Any]]:
+    """Run one step's tool calls concurrently, yielding tool events and appending entries to tool_calls_made.
+    
+    A call identical to an earlier successful one in this request reuses its result.
+    Calls still running at the deadline are cancelled and recorded as errors.
+    """
+    loop = asyncio.get_running_loop()
+    step_started_ms = round((loop.time() - started) * 1000, 1)
+    first_index = len(tool_calls_made)
+    entries: List[Optional[Dict[str, Any]]] = [None] * len(requested)
+    tasks: Dict[int, asyncio.Future] = {}
+    
+    # Progress events are queued by the tools and relayed here as they happen
+    events: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+    for i, tool_call in enumerate(requested):
+        key = tool_call_key(tool_call)
+        if key in reusable:
+            logger.info(f"Reusing result of {tool_call['function']['name']} from an earlier step")
+            entries[i] = dict(reusable[key], duration_ms=0.0, reused=True)
+            yield {"type": "tool_start", "index": first_index + i, "function": entries[i]["function"], "arguments": entries[i]["arguments"]}
+            yield {"type": "tool_end", "index": first_index + i, "function": entries[i]["function"], "result": entries[i]["result"]}
+        else:
+            tasks[i] = asyncio.ensure_future(execute_tool_call(first_index + i, tool_call, semaphore, events.put_nowait))
+    
+    if tasks:
+        waiter = asyncio.ensure_future(asyncio.wait(list(tasks.values()), timeout=max(deadline - loop.time(), 0)))
+        waiter.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+        finally:
+            waiter.cancel()
+            for task in tasks.values():
+                task.cancel()
+        
+        for i, task in tasks.items():
+            if task.done() and not task.cancelled():
+                entries[i] = task.result()
+                continue
+            function_name = requested[i]['function']['name']
+            logger.warning(f"Cancelled tool {function_name}: request deadline of {AGENT_DEADLINE:g}s exceeded")
+            entries[i] = {
+                "function": function_name,
+                "arguments": requested[i]['function']['arguments'],
+                "result": {"status": "error", "message": f"Cancelled: request deadline of {AGENT_DEADLINE:g} seconds exceeded"},
+                "duration_ms": round((loop.time() - started) * 1000 - step_started_ms, 1)
+            }
+            yield {"type": "tool_end", "index": first_index + i, "function": function_name, "result": entries[i]["result"]}
+    
+    for i, entry in enumerate(entries):
+        entry["step"] = step
+        entry["started_ms"] = step_started_ms
+        if entry["result"].get("status") == "success" and not entry.get("reused"):
+            reusable[tool_call_key(requested[i])] = {key: entry[key] for key in ("function", "arguments", "result")}
+        tool_calls_made.append(entry)
+
+async def ollama_chat_events(messages: List[Any], use_tools: bool, stream: bool) -> AsyncIterator[Dict[str, Any]]:
+    """Call Ollama, yielding token events while streaming and finally a message event"""
+    # keep_alive keeps the model loaded so Ollama can reuse the KV cache of an unchanged prompt prefix
+    kwargs = {"model": OLLAMA_MODEL, "messages": messages, "keep_alive": OLLAMA_KEEP_ALIVE}
+    if use_tools:
+        kwargs["tools"] = tools
+    stage = "llm_tools" if use_tools else "llm_answer"
+    
+    started = time.perf_counter()
+    status = "error"
+    try:
+        if not stream:
+            with span(stage):
+                response = await ollama_client.chat(**kwargs)
+            status = "ok"
+            logger.debug("Ollama response received: %s", type(response))
+            yield {"type": "message", "message": response.message}
+            return
+        
+        content_parts = []
+        tool_calls = []
+        with span(stage):
+            async for chunk in await ollama_client.chat(stream=True, **kwargs):
+                if chunk.message.content:
+                    content_parts.append(chunk.message.content)
+                    yield {"type": "token", "content": chunk.message.content}
+                if chunk.message.tool_calls:
+                    tool_calls.extend(chunk.message.tool_calls)
+        status = "ok"
+    finally:
+        metrics.observe_upstream("ollama", status, time.perf_counter() - started)
+    
+    yield {"type": "message", "message": ollama.Message(
+        role="assistant",
+        content="".join(content_parts),
+        tool_calls=tool_calls or None
+    )}
+
+async def admitted_chat_events(messages: List[Any], use_tools: bool, stream: bool,
+                               resume: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """ollama_chat_events under an LLM admission slot, held only while the model generates.
+    
+    Events are buffered, so a slow client reading the stream does not keep the slot
+    busy. Raises OverloadedError before the first event when no slot frees up in time.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def generate():
+        try:
+            async with llm_admission.slot(resume=resume):
+                async for event in ollama_chat_events(messages, use_tools=use_tools, stream=stream):
+                    events.put_nowait(event)
+            events.put_nowait(None)
+        except Exception as e:
+            events.put_nowait(e)
+    
+    task = asyncio.ensure_future(generate())
+    try:
+        while (event := await events.get()) is not None:
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    finally:
+        # Client went away: stop generating and free the slot
+        task.cancel()
+
+def without_tool_results(tool_calls: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """tool_calls entries with each result reduced to its status"""
+    if not tool_calls:
+        return tool_calls
+    return [
+        dict({key: value for key, value in call.items() if key != "result"}, status=call["result"].get("status"))
+        for call in tool_calls
+    ]
+
+async def chat_events(request: ChatRequest, stream: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Run one chat turn as a sequence of events.
+    
+    Emits tool_start/tool_end as tools run, map_data as soon as all tools finish,
+    token events for the answer when stream is true, and a final done event
+    carrying the complete ChatResponse.
+    """
+    request_started = time.perf_counter()
+    
+    # Resume the server-side session, or start one from the history the client sent
+    with span("session_load"):
+        session_id = request.session_id
+        history = await asyncio.to_thread(session_store.history, session_id) if session_id else None
+        if history is None:
+            history = compact_messages(
+                [{"role": msg["role"], "content": msg["content"]} for msg in request.conversation_history],
+                SESSION_TOKEN_BUDGET, SESSION_KEEP_TURNS
+            )
+            session_id = await asyncio.to_thread(session_store.create, history, session_id)
+    logger.info(f"Received chat request: '{request.message[:100]}...' in session {session_id} with {len(history)} history messages")
+    
+    messages = list(history)
+    turn_start = len(messages)
+    
+    # Add current user message
+    messages.append({
+        "role": "user",
+        "content": request.message
+    })
+    
+    # Serve repeated questions from the response cache (works even while Ollama is down)
+    cache_key = cache_context = cache_embedding = None
+    if response_cache is not None:
+        with span("response_cache"):
+            cache_key, cache_context = ResponseCache.make_keys(messages, OLLAMA_MODEL, tools)
+            cached, cache_kind, cache_embedding = await response_cache.lookup(cache_key, cache_context, request.message)
+        if cached is not None:
+            logger.info(f"Response cache hit ({cache_kind})")
+            result = ChatResponse(**dict(cached, response_path="cache", session_id=session_id), cached=cache_kind)
+            if not request.include_tool_calls:
+                result.tool_calls = without_tool_results(result.tool_calls)
+            response_path_counts["cache"] += 1
+            await asyncio.to_thread(session_store.append, session_id, messages[turn_start:] + [{"role": "assistant", "content": result.response}])
+            if result.map_data is not None:
+                yield {"type": "map_data", "map_data": result.map_data}
+            if stream:
+                yield {"type": "token", "content": result.response}
+            metrics.observe_stage("chat_total", time.perf_counter() - request_started)
+            yield {"type": "done", "result": result}
+            return
+    
+    logger.debug("Sending %d messages to Ollama model: %s", len(messages), OLLAMA_MODEL)
+    
+    # Fail fast if the background monitor last saw Ollama down (no per-request probe)
+    if health_monitor.is_down("ollama"):
+        ollama_info = ollama_health()["status"]
+        logger.error(f"Ollama is known to be unavailable: {ollama_info}")
+        raise HTTPException(status_code=503, detail=f"Ollama service unavailable: {ollama_info}")
+    
+    # Agent loop: each step the model either answers or asks for more tools, whose
+    # results are fed back so it can chain calls (geocode, then search nearby, ...)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + AGENT_DEADLINE
+    tool_calls_made = []
+    reusable: Dict[str, Dict[str, Any]] = {}
+    map_data = None
+    response_path = "direct"
+    use_tools = True
+    step = 0
+    
+    while True:
+        logger.debug("Making chat request to Ollama (step %d, tools %s)...", step + 1, "on" if use_tools else "off")
+        assistant_message = None
+        try:
+            # Later rounds of this turn wait at the front of the queue
+            async for event in admitted_chat_events(messages, use_tools=use_tools, stream=stream, resume=step > 0):
+                if event["type"] == "message":
+                    assistant_message = event["message"]
+                else:
+                    yield event
+        except OverloadedError as e:
+            # Before the first round nothing has been streamed yet, so this is a plain 429
+            logger.warning(f"Shedding chat request: {str(e)}")
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        payload_logger.debug("Assistant message: %s", assistant_message)
         
-        logger.debug(f"Ollama response received: {type(response)}")
-        logger.debug(f"Response type: {type(response)}")
+        requested = assistant_message.get('tool_calls') if use_tools else None
+        if not requested:
+            response_text = getattr(assistant_message, 'content', '') or ''
+            if step == 0:
+                logger.info(f"Direct response (no tools): {response_text[:100]}...")
+            else:
+                response_path = "llm"
+                logger.info(f"Final response generated after {step} tool steps: {response_text[:100]}...")
+            break
         
-        assistant_message = response.message
-        logger.debug(f"Assistant message: {assistant_message}")
+        step += 1
+        logger.info(f"Step {step}: model requested {len(requested)} tool calls")
+        first_index = len(tool_calls_made)
+        with span("tool_step", step=step):
+            async for event in run_tool_step(step, requested, tool_calls_made, reusable, started, deadline):
+                yield event
+        step_calls = tool_calls_made[first_index:]
         
-        tool_calls_made = []
-        map_data = None
+        # Map data follows the last successful tool call; send it to the client
+        # right away so markers appear while the answer is still being generated
+        successful = [call for call in step_calls if call["result"].get("status") == "success"]
+        if successful:
+            map_data = successful[-1]["result"]
+            logger.debug("Map data updated from tool result")
+            yield {"type": "map_data", "map_data": map_data}
         
-        # Check if the model wants to use tools
-        if assistant_message.get('tool_calls'):
-            logger.info(f"Model requested {len(assistant_message['tool_calls'])} tool calls")
-            
-            for i, tool_call in enumerate(assistant_message['tool_calls']):
-                logger.debug(f"Processing tool call {i+1}: {tool_call}")
-                
-                function_name = tool_call['function']['name']
-                arguments = tool_call['function']['arguments']
-                
-                logger.info(f"Executing tool: {function_name} with args: {arguments}")
-                
-                if function_name in available_functions:
-                    try:
-                        function_result = available_functions[function_name](**arguments)
-                        logger.debug(f"Tool {function_name} result: {function_result}")
-                        
-                        tool_calls_made.append({
-                            "function": function_name,
-                            "arguments": arguments,
-                            "result": function_result
-                        })
-                        
-                        # Store map data from successful tool calls
-                        if function_result.get("status") == "success":
-                            map_data = function_result
-                            logger.debug("Map data updated from tool result")
-                        
-                    except Exception as e:
-                        logger.error(f"Error executing tool {function_name}: {str(e)}")
-                        logger.error(f"Traceback: {traceback.format_exc()}")
-                        
-                        tool_calls_made.append({
-                            "function": function_name,
-                            "arguments": arguments,
-                            "result": {"status": "error", "message": str(e)}
-                        })
-                else:
-                    logger.error(f"Unknown function requested: {function_name}")
-                    tool_calls_made.append({
-                        "function": function_name,
-                        "arguments": arguments,
-                        "result": {"status": "error", "message": f"Unknown function: {function_name}"}
-                    })
-            
-            # Add assistant message and tool results back to conversation
-            messages.append(assistant_message)
-            
-            for i, tool_call in enumerate(assistant_message['tool_calls']):
-                tool_result_message = {
-                    "role": "tool",
-                    "content": json.dumps(tool_calls_made[i]["result"])
-                }
-                messages.append(tool_result_message)
-                logger.debug(f"Added tool result message: {tool_result_message}")
-            
-            # Get final response from Ollama with tool results
-            logger.debug("Getting final response from Ollama with tool results...")
-            final_response = ollama.chat(
-                model=OLLAMA_MODEL,
-                messages=messages
-            )
-            
-            response_text = final_response.message.content
-            logger.info(f"Final response generated: {response_text[:100]}...")
-        else:
-            # No tools needed, use direct response
-            response_text = getattr(assistant_message, 'content', '')
-            logger.info(f"Direct response (no tools): {response_text[:100]}...")
-        
-        result = ChatResponse(
-            response=response_text,
-            tool_calls=tool_calls_made if tool_calls_made else None,
-            map_data=map_data
-        )
+        # Add assistant message and tool results back to conversation
+        messages.append(assistant_message)
+        for call in step_calls:
+            tool_result_message = {
+                "role": "tool",
+                # The model gets a trimmed view; the full result goes to map_data
+                "content": dumps(llm_view(call["result"], LLM_MAX_PLACES))
+            }
+            messages.append(tool_result_message)
+            payload_logger.debug("Added tool result message: %s", tool_result_message)
         
-        logger.info(f"Chat request completed successfully. Tools used: {len(tool_calls_made)}, Map data: {map_data is not None}")
+        response_text = render_tool_results(tool_calls_made)
+        if response_text is not None:
+            # Fast path: deterministic results are summarized without another LLM round
+            response_path = "template"
+            logger.info(f"Templated response (fast path): {response_text[:100]}...")
+            if stream:
+                yield {"type": "token", "content": response_text}
+            break
+        
+        if step >= AGENT_MAX_STEPS or loop.time() >= deadline:
+            logger.warning(f"Agent loop stopped after {step} steps ({loop.time() - started:.1f}s); asking for a final answer")
+            use_tools = False
+    
+    response_path_counts[response_path] += 1
+    result = ChatResponse(
+        response=response_text,
+        tool_calls=tool_calls_made if tool_calls_made else None,
+        map_data=map_data,
+        response_path=response_path,
+        session_id=session_id
+    )
+    
+    # The session keeps this turn's tool calls and results for later turns
+    with span("session_save"):
+        await asyncio.to_thread(session_store.append, session_id, messages[turn_start:] + [{"role": "assistant", "content": response_text}])
+    
+    # Only cache complete answers: a failed tool call may succeed next time
+    if response_cache is not None and all(call["result"].get("status") == "success" for call in tool_calls_made):
+        with span("response_cache_put"):
+            await response_cache.put(
+                cache_key, cache_context, result.model_dump(exclude={"cached", "response_path", "session_id"}),
+                request.message, cache_embedding
+            )
+    
+    if not request.include_tool_calls:
+        result.tool_calls = without_tool_results(result.tool_calls)
+    
+    metrics.observe_stage("chat_total", time.perf_counter() - request_started)
+    logger.info(f"Chat request completed successfully. Tools used: {len(tool_calls_made)}, Map data: {map_data is not None}")
+    yield {"type": "done", "result": result}
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_with_llm(request: ChatRequest):
+    try:
+        result = None
+        async for event in chat_events(request):
+            if event["type"] == "done":
+                result = event["result"]
         return result
         
     except HTTPException:
@@ -484,6 +1225,199 @@ async def chat_with_llm(request: ChatRequest):
         logger.error(f"Full traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def format_sse(event: Dict[str, Any], include_tool_calls: bool = True) -> str:
+    """Encode an event as a server-sent event frame"""
+    payload = {key: value for key, value in event.items() if key != "type"}
+    if event["type"] == "tool_end" and not include_tool_calls:
+        # Same reduction as without_tool_results: clients asked for map_data only
+        payload["status"] = payload.pop("result").get("status")
+    elif event["type"] == "done":
+        payload = payload["result"].model_dump()
+    return f"event: {event['type']}\ndata: {dumps(payload)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Streaming variant of /chat using server-sent events.
+    
+    Events: tool_start, tool_end, map_data, token (answer text as it is generated),
+    done (the full ChatResponse) and error.
+    """
+    events = chat_events(request, stream=True)
+    
+    # Run up to the first event before responding so setup failures (e.g. Ollama down)
+    # still surface as normal HTTP errors
+    try:
+        first_event = await events.__anext__()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in chat stream: {str(e)}")
+        logger.error(f"Full traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    async def event_stream():
+        try:
+            yield format_sse(first_event, request.include_tool_calls)
+            async for event in events:
+                yield format_sse(event, request.include_tool_calls)
+        except Exception as e:
+            logger.error(f"Error during chat stream: {str(e)}")
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+            message = e.detail if isinstance(e, HTTPException) else str(e)
+            yield format_sse({"type": "error", "message": message})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def geocode_unique(addresses: List[str]) -> AsyncIterator[tuple]:
+    """Geocode each distinct address once at batch priority, yielding (address, result) as they finish"""
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def geocode_one(address):
+        async with semaphore:
+            return address, await geocode_address_async(address, priority=PRIORITY_BATCH)
+    
+    tasks = [asyncio.ensure_future(geocode_one(address)) for address in dict.fromkeys(addresses)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away: stop queueing upstream requests for it
+        for task in tasks:
+            task.cancel()
+
+def ndjson_line(payload: Dict[str, Any]) -> str:
+    return dumps(payload) + "\n"
+
+@app.post("/geocode/batch")
+async def geocode_batch(request: BatchGeocodeRequest):
+    """Geocode many addresses, streaming one NDJSON line per input address as results arrive.
+    
+    Duplicate addresses are looked up once; lookups share Nominatim's rate limit
+    with chat traffic but are queued behind it.
+    """
+    if len(request.addresses) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} addresses per request")
+    
+    logger.info(f"Batch geocode request: {len(request.addresses)} addresses")
+    positions: Dict[str, List[int]] = {}
+    for i, address in enumerate(request.addresses):
+        positions.setdefault(address, []).append(i)
+    
+    async def results():
+        async for address, result in geocode_unique(request.addresses):
+            for i in positions[address]:
+                yield ndjson_line({"index": i, "address": address, "result": result})
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/distance-matrix")
+async def distance_matrix(request: DistanceMatrixRequest):
+    """Straight-line distance and estimated travel time between every origin and destination.
+    
+    All distinct addresses are geocoded first (deduplicated, rate-limited), then the
+    N x M matrix is computed in one vectorized pass and streamed as one NDJSON
+    line per origin. Unresolvable addresses yield null cells plus an error field.
+    """
+    if len(request.origins) * len(request.destinations) > BATCH_MAX_ITEMS * 10 or \
+            len(request.origins) + len(request.destinations) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail="Distance matrix too large")
+    if request.mode not in ESTIMATED_SPEEDS_KMH:
+        raise HTTPException(status_code=422, detail=f"Unknown mode: {request.mode}")
+    
+    logger.info(f"Distance matrix request: {len(request.origins)} x {len(request.destinations)} ({request.mode})")
+    
+    async def rows():
+        geocoded: Dict[str, Dict[str, Any]] = {}
+        async for address, result in geocode_unique(request.origins + request.destinations):
+            geocoded[address] = result
+        
+        def coordinates(addresses):
+            coords = np.full((len(addresses), 2), np.nan)
+            for i, address in enumerate(addresses):
+                result = geocoded[address]
+                if result.get("status") == "success":
+                    coords[i] = (result["coordinates"]["lat"], result["coordinates"]["lng"])
+            return coords
+        
+        distances_km = haversine_matrix_m(coordinates(request.origins), coordinates(request.destinations)) / 1000
+        durations_min = distances_km / ESTIMATED_SPEEDS_KMH[request.mode] * 60
+        
+        for i, origin in enumerate(request.origins):
+            row = {
+                "origin_index": i,
+                "origin": origin,
+                "distances_km": [None if np.isnan(d) else round(float(d), 3) for d in distances_km[i]],
+                "durations_min": [None if np.isnan(d) else round(float(d), 1) for d in durations_min[i]],
+                "mode": request.mode,
+                "routing": "estimate"
+            }
+            if geocoded[origin].get("status") != "success":
+                row["error"] = f"Origin: {geocoded[origin].get('message')}"
+            yield ndjson_line(row)
+    
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a chat session's server-side history"""
+    if not await asyncio.to_thread(session_store.delete, session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return {"status": "deleted", "session_id": session_id}
+
+@app.on_event("startup")
+async def open_gazetteer():
+    global gazetteer
+    if GEOCODER_BACKEND in ("local", "local_first"):
+        try:
+            gazetteer = Gazetteer(GAZETTEER_PATH)
+        except Exception as e:
+            if GEOCODER_BACKEND == "local":
+                # Offline-only deployments must not start talking to Nominatim unnoticed
+                logger.error(f"Failed to open gazetteer at {GAZETTEER_PATH}: {str(e)}")
+                raise
+            logger.error(f"Failed to open gazetteer at {GAZETTEER_PATH}, using Nominatim: {str(e)}")
+
+@app.on_event("startup")
+async def load_road_graph():
+    global road_graph
+    if ROUTING_GRAPH_PATH:
+        try:
+            road_graph = await asyncio.to_thread(RoadGraph.load, ROUTING_GRAPH_PATH)
+        except Exception as e:
+            logger.error(f"Failed to load road graph from {ROUTING_GRAPH_PATH}: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
+@app.on_event("startup")
+async def load_place_index():
+    global place_index
+    if POI_INDEX_PATH:
+        try:
+            loaded = await asyncio.to_thread(PlaceIndex.load, POI_INDEX_PATH, POI_INDEX_CELL_DEG, POI_INDEX_MAX_PLACES)
+            # Keep anything searches added while the index was loading
+            loaded.add_many(place_index.places())
+            place_index = loaded
+        except Exception as e:
+            logger.error(f"Failed to load place index from {POI_INDEX_PATH}: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
+@app.on_event("startup")
+async def start_tracing():
+    metrics.setup_tracing("maps-ai", OTEL_EXPORTER_OTLP_ENDPOINT)
+
+@app.on_event("startup")
+async def start_health_monitor():
+    await health_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    await health_monitor.stop()
+    await close_http_client()
+    tool_registry.shutdown()
+
 @app.get("/")
 async def root():
     logger.info("Root endpoint accessed")
@@ -491,40 +1425,62 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint with detailed status"""
+    """Health check endpoint with detailed status (served from the background monitor's cache)"""
     try:
-        # Check Ollama connection
-        ollama_ok, ollama_info = check_ollama_connection()
-        if ollama_ok:
-            # Check if the specific model is available
-            if isinstance(ollama_info, list) and any(OLLAMA_MODEL in str(model) for model in ollama_info):
-                ollama_status = "ready"
-            else:
-                ollama_status = f"model {OLLAMA_MODEL} not found in: {ollama_info}"
-        else:
-            ollama_status = f"error: {ollama_info}"
-        
-        # Check external API
-        nominatim_status = "unknown"
-        try:
-            response = requests.get("https://nominatim.openstreetmap.org/search?q=test&format=json&limit=1", 
-                                  headers={"User-Agent": "MapsAI/1.0"}, timeout=5)
-            nominatim_status = "ready" if response.status_code == 200 else f"error: {response.status_code}"
-        except Exception as e:
-            nominatim_status = f"error: {str(e)}"
+        ollama = ollama_health()
+        nominatim = nominatim_health()
+        # Both count rows in SQLite files other workers may be writing to
+        cache_stats = await asyncio.to_thread(geocode_cache.stats)
+        session_stats = await asyncio.to_thread(session_store.stats)
         
         return {
             "status": "running",
-            "ollama": ollama_status,
-            "nominatim": nominatim_status,
+            "ollama": ollama["status"],
+            "nominatim": nominatim["detail"],
             "model": OLLAMA_MODEL,
-            "available_models": ollama_info if ollama_ok else None
+            "available_models": ollama["available_models"],
+            "checked_at": {"ollama": ollama["checked_at"], "nominatim": nominatim["checked_at"]},
+            "routing": f"road graph ({road_graph.node_count} nodes)" if road_graph is not None else "estimate",
+            "place_index": len(place_index),
+            "geocoder": f"{GEOCODER_BACKEND} ({gazetteer.size} names)" if gazetteer is not None else "nominatim",
+            "geocode_cache": cache_stats,
+            "response_cache": response_cache.stats() if response_cache is not None else "disabled",
+            "response_paths": dict(response_path_counts),
+            "tools": tool_registry.stats(),
+            "sessions": session_stats,
+            "nominatim_scheduler": nominatim_scheduler.stats(),
+            "nominatim_upstream": nominatim_upstream.stats(),
+            "llm_admission": llm_admission.stats(),
+            "worker_pid": os.getpid()
         }
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: stage/tool/upstream latency histograms plus cache and queue gauges"""
+    body = await asyncio.to_thread(metrics.render)  # collectors read the SQLite-backed stores
+    if body is None:
+        raise HTTPException(status_code=501, detail="Metrics need prometheus_client (pip install prometheus_client)")
+    return Response(content=body, media_type=metrics.CONTENT_TYPE_LATEST)
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness: Ollama is reachable with the configured model (503 otherwise)"""
+    ollama = ollama_health()
+    if not ollama["healthy"]:
+        raise HTTPException(status_code=503, detail=f"Not ready: {ollama['status']}")
+    return {"status": "ready", "nominatim": nominatim_health()["detail"]}
+
 if __name__ == "__main__":
     import uvicorn
-    logger.info(f"Starting Maps AI API with model: {OLLAMA_MODEL}")
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
+    logger.info(f"Starting Maps AI API with model: {OLLAMA_MODEL} ({WEB_CONCURRENCY} workers)")
+    # Worker processes each import the app, so uvicorn needs an import string for them
+    target = app if WEB_CONCURRENCY == 1 else "main:app"
+    uvicorn.run(target, host="0.0.0.0", port=8000, workers=WEB_CONCURRENCY, log_level="info")
\ No newline at end of file
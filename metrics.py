@@ -0,0 +1,154 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # metrics are optional: pip install prometheus_client
+    CollectorRegistry = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+try:
+    from opentelemetry import trace
+except ImportError:  # tracing is optional: pip install opentelemetry-sdk opentelemetry-exporter-otlp
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets from 5ms to 2 minutes (LLM rounds on CPU can take a while)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+registry = CollectorRegistry() if CollectorRegistry is not None else None
+
+if registry is not None:
+    STAGE_SECONDS = Histogram(
+        "maps_stage_seconds", "Time spent in each stage of a chat request",
+        ["stage"], buckets=LATENCY_BUCKETS, registry=registry
+    )
+    TOOL_SECONDS = Histogram(
+        "maps_tool_seconds", "Tool call latency", ["tool", "status"], buckets=LATENCY_BUCKETS, registry=registry
+    )
+    UPSTREAM_SECONDS = Histogram(
+        "maps_upstream_seconds", "Outbound request latency", ["upstream"], buckets=LATENCY_BUCKETS, registry=registry
+    )
+    UPSTREAM_RESPONSES = Counter(
+        "maps_upstream_responses_total", "Outbound requests by result (HTTP status, 'error' or 'timeout')",
+        ["upstream", "status"], registry=registry
+    )
+    UPSTREAM_RETRIES = Counter(
+        "maps_upstream_retries_total", "Outbound requests retried", ["upstream"], registry=registry
+    )
+
+_tracer = None
+# name -> stats() callable; numeric values are exported as gauges at scrape time
+_stats_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def setup_tracing(service_name: str, endpoint: Optional[str]) -> bool:
+    """Export spans over OTLP to endpoint (e.g. a local collector); returns False if unavailable"""
+    global _tracer
+    if not endpoint or trace is None:
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.warning("OTLP endpoint configured but opentelemetry-sdk/opentelemetry-exporter-otlp are not installed")
+        return False
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces")))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(service_name)
+    logger.info(f"Exporting traces to {endpoint}")
+    return True
+
+
+@contextmanager
+def request_span(name: str, **attributes: Any) -> Iterator[None]:
+    """Root span for a request; stage spans started inside it become its children"""
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes):
+        yield
+
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[None]:
+    """Time a stage into maps_stage_seconds (and a trace span when tracing is on).
+
+    The span is not made current, so this is safe to hold across yields in
+    async generators.
+    """
+    otel_span = _tracer.start_span(stage, attributes=attributes) if _tracer is not None else None
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+        if otel_span is not None:
+            otel_span.end()
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if registry is not None:
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def observe_tool(tool: str, status: str, seconds: float) -> None:
+    if registry is not None:
+        TOOL_SECONDS.labels(tool, status).observe(seconds)
+
+
+def observe_upstream(upstream: str, status: Any, seconds: Optional[float] = None) -> None:
+    """Count one outbound request by status and record its latency"""
+    if registry is not None:
+        UPSTREAM_RESPONSES.labels(upstream, str(status)).inc()
+        if seconds is not None:
+            UPSTREAM_SECONDS.labels(upstream).observe(seconds)
+
+
+def count_retry(upstream: str) -> None:
+    if registry is not None:
+        UPSTREAM_RETRIES.labels(upstream).inc()
+
+
+def register_stats(name: str, source: Callable[[], Dict[str, Any]]) -> None:
+    """Export a subsystem's stats() dict (cache hit rates, queue depths, ...) as maps_<name>_<key> gauges"""
+    _stats_sources[name] = source
+
+
+def _flatten(prefix: str, stats: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    for key, value in stats.items():
+        name = f"{prefix}_{key}".replace("-", "_").replace(".", "_")
+        if isinstance(value, (int, float)):
+            yield name, float(value)
+        elif isinstance(value, dict):
+            yield from _flatten(name, value)
+
+
+class _StatsCollector:
+    def collect(self):
+        for source_name, source in list(_stats_sources.items()):
+            try:
+                stats = source()
+            except Exception as e:
+                logger.warning(f"Stats source {source_name} failed: {str(e)}")
+                continue
+            for name, value in _flatten(f"maps_{source_name}", stats):
+                yield GaugeMetricFamily(name, f"{source_name} stats", value=value)
+
+
+if registry is not None:
+    registry.register(_StatsCollector())
+
+
+def render() -> Optional[bytes]:
+    """Prometheus text exposition of all metrics, or None without prometheus_client"""
+    if registry is None:
+        return None
+    return generate_latest(registry)
@@ -0,0 +1,62 @@
+import bz2
+import gzip
+import logging
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ("node", id, (lat, lon), tags) or ("way", id, [node refs], tags)
+OsmElement = Tuple[str, int, Any, Dict[str, str]]
+
+
+def iter_osm(path: str) -> Iterator[OsmElement]:
+    """Stream nodes and ways from an OpenStreetMap extract (.osm/.osm.bz2/.osm.gz or .pbf)"""
+    if path.endswith(".pbf"):
+        return _iter_pbf(path)
+    return _iter_xml(path)
+
+
+def _open(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _iter_xml(path: str) -> Iterator[OsmElement]:
+    logger.info(f"Reading OSM XML extract: {path}")
+    with _open(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            tag = elem.tag
+            if tag == "node":
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                yield "node", int(elem.get("id")), (float(elem.get("lat")), float(elem.get("lon"))), tags
+            elif tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                yield "way", int(elem.get("id")), refs, tags
+            elif tag != "relation":
+                continue
+            # Drop finished top-level elements so memory stays flat on large extracts
+            root.clear()
+
+
+def _iter_pbf(path: str) -> Iterator[OsmElement]:
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Reading .pbf extracts requires pyosmium: pip install osmium")
+
+    logger.info(f"Reading OSM PBF extract: {path}")
+    for obj in osmium.FileProcessor(path):
+        if obj.is_node():
+            if obj.location.valid():
+                yield "node", obj.id, (obj.location.lat, obj.location.lon), dict(obj.tags)
+        elif obj.is_way():
+            yield "way", obj.id, [n.ref for n in obj.nodes], dict(obj.tags)
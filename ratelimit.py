@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 5
+PRIORITY_BACKGROUND = 10
+
+
+class QueueFullError(Exception):
+    """Raised when the outbound queue is full and a request is shed"""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    # Whether operations may block (on I/O), so async callers must run them in a thread
+    blocking = False
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+        self._updated = max(now, self._updated)
+
+    def time_until_available(self) -> float:
+        """Seconds until a token can be taken (0 if one is available now)"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def consume(self) -> None:
+        self._refill(time.monotonic())
+        self._tokens -= 1
+
+    def try_consume(self) -> float:
+        """Take a token if one is available and return 0, else the seconds until one is"""
+        delay = self.time_until_available()
+        if delay <= 0:
+            self.consume()
+        return delay
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (e.g. after an upstream 429)"""
+        self._refill(time.monotonic())
+        self._tokens = min(self._tokens, 0.0)
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket whose state lives in SQLite, shared by all worker processes on a host.
+
+    Every operation loads the state, applies the in-memory logic and writes it
+    back inside one IMMEDIATE transaction, so concurrent workers never hand
+    out the same token. Times are time.monotonic(), which is host-wide.
+    Waiting for the database lock blocks, so the scheduler calls it from a thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, name: str, rate: float, capacity: float = 1.0):
+        super().__init__(rate, capacity)
+        self.name = name
+        self._depth = 0
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets ("
+            " name TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated REAL NOT NULL,"
+            " paused_until REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO token_buckets (name, tokens, updated, paused_until) VALUES (?, ?, ?, ?)",
+            (name, self._tokens, self._updated, self._paused_until),
+        )
+        logger.info(f"Token bucket '{name}' shared through '{path}'")
+
+    @contextmanager
+    def _shared_state(self) -> Iterator[None]:
+        with self._lock:
+            if self._depth:
+                # Nested call (e.g. try_consume -> consume) inside the open transaction
+                yield
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                self._tokens, self._updated, self._paused_until = self._conn.execute(
+                    "SELECT tokens, updated, paused_until FROM token_buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.monotonic()
+                if self._updated > now:
+                    # Monotonic clock restarted (host reboot): the stored state is meaningless
+                    self._tokens, self._updated, self._paused_until = self.capacity, now, 0.0
+                yield
+                self._conn.execute(
+                    "UPDATE token_buckets SET tokens = ?, updated = ?, paused_until = ? WHERE name = ?",
+                    (self._tokens, self._updated, self._paused_until, self.name),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._depth -= 1
+
+    def time_until_available(self) -> float:
+        with self._shared_state():
+            return super().time_until_available()
+
+    def consume(self) -> None:
+        with self._shared_state():
+            super().consume()
+
+    def try_consume(self) -> float:
+        with self._shared_state():
+            return super().try_consume()
+
+    def pause(self, seconds: float) -> None:
+        with self._shared_state():
+            super().pause(seconds)
+
+
+class _SharedRequest:
+    """One queued or running upstream call and the callers waiting for it"""
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.waiters = 0
+        self.entry: Optional[Tuple[int, int, asyncio.Future]] = None  # queue entry while waiting for a token
+        self.task: Optional[asyncio.Task] = None
+
+
+class OutboundScheduler:
+    """Process-wide scheduler for calls to a rate-limited upstream.
+
+    Requests wait in a priority queue and are released at the token bucket's
+    rate, so interactive traffic is served before health checks. Identical
+    requests that are in flight at the same time share one upstream call,
+    queued at the most urgent priority among its callers; it runs on its own
+    task, so it is only cancelled once every caller has given up.
+    Pass a SharedTokenBucket as `bucket` to split the rate across processes.
+    """
+
+    def __init__(self, rate_per_second: float = 1.0, burst: float = 1.0, max_queue_size: int = 100,
+                 bucket: Optional[TokenBucket] = None):
+        self.bucket = bucket if bucket is not None else TokenBucket(rate_per_second, burst)
+        self.max_queue_size = max_queue_size
+
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._inflight: Dict[str, _SharedRequest] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "shed": 0}
+
+    async def submit(
+        self,
+        key: str,
+        request_fn: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Any:
+        """Run request_fn once a rate-limit slot is free, sharing the result with identical requests"""
+        self._ensure_loop()
+        self._stats["requests"] += 1
+
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self._stats["coalesced"] += 1
+            logger.debug("Coalescing outbound request: %s", key)
+            self._raise_priority(shared, priority)
+        else:
+            shared = self._inflight[key] = _SharedRequest(priority)
+            shared.task = self._loop.create_task(self._run(key, shared, request_fn))
+            # Mark the exception as retrieved when every caller gave up before it finished
+            shared.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if not shared.waiters and not shared.task.done():
+                # Nobody is left to use the answer (timeouts, disconnects): stop queueing for it
+                if self._inflight.get(key) is shared:
+                    del self._inflight[key]
+                shared.task.cancel()
+
+    def pause(self, seconds: float) -> None:
+        """Back off all outbound traffic, e.g. after the upstream answered 429"""
+        logger.warning(f"Pausing outbound requests for {seconds:.1f}s")
+        if self.bucket.blocking and self._loop is not None and self._loop.is_running():
+            self._loop.run_in_executor(None, self.bucket.pause, seconds)
+        else:
+            self.bucket.pause(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["queue_depth"] = len(self._queue)
+        stats["inflight"] = len(self._inflight)
+        return stats
+
+    async def _run(self, key: str, shared: _SharedRequest, request_fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            await self._acquire(shared)
+            self._stats["upstream_calls"] += 1
+            return await request_fn()
+        finally:
+            if self._inflight.get(key) is shared:
+                del self._inflight[key]
+
+    async def _acquire(self, shared: _SharedRequest) -> None:
+        if len(self._queue) >= self.max_queue_size:
+            self._make_room(shared.priority)
+
+        waiter = self._loop.create_future()
+        shared.entry = (shared.priority, next(self._counter), waiter)
+        heapq.heappush(self._queue, shared.entry)
+        self._wakeup.set()
+        await waiter
+
+    def _raise_priority(self, shared: _SharedRequest, priority: int) -> None:
+        """Move a shared request up to the priority of a more urgent caller that joined it"""
+        if priority >= shared.priority:
+            return
+        shared.priority = priority  # used by _acquire if it has not queued yet
+        entry = shared.entry
+        if entry is None or entry[2].done():
+            return  # not queued yet, or already released
+        # Keep the original sequence number: it still goes ahead of later requests at this priority
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        shared.entry = (priority, entry[1], entry[2])
+        heapq.heappush(self._queue, shared.entry)
+
+    def _make_room(self, priority: int) -> None:
+        """Free a queue slot for a request of `priority`, shedding the least important request"""
+        # Callers that gave up still occupy entries until the dispatcher reaches them
+        self._queue = [entry for entry in self._queue if not entry[2].done()]
+        heapq.heapify(self._queue)
+        if len(self._queue) < self.max_queue_size:
+            return
+        self._stats["shed"] += 1
+        # Lowest priority, newest first: batch work waits behind interactive lookups, never the reverse
+        victim = max(self._queue, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= priority:
+            raise QueueFullError("Too many queued requests to upstream service, try again later")
+        self._queue.remove(victim)
+        heapq.heapify(self._queue)
+        victim[2].set_exception(QueueFullError("Shed from the upstream queue for a higher-priority request"))
+
+    def _ensure_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._dispatcher is not None and not self._dispatcher.done():
+            return
+        # First use, or a new event loop (sync wrappers run each call in their own loop)
+        self._loop = loop
+        self._queue = []
+        self._inflight = {}
+        self._wakeup = asyncio.Event()
+        self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Drop requests whose callers gave up (timeout or disconnect) while queued
+            while self._queue and self._queue[0][2].done():
+                heapq.heappop(self._queue)
+            if not self._queue:
+                continue
+
+            if self.bucket.blocking:
+                delay = await asyncio.to_thread(self.bucket.try_consume)
+            else:
+                delay = self.bucket.try_consume()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.done():
+                continue  # gave up while the token was being taken; it is not given back
+            waiter.set_result(None)
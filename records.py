@@ -0,0 +1,115 @@
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional: pip install orjson
+    orjson = None
+
+# Result fields only the map needs; they are left out of the LLM's view
+MAP_ONLY_FIELDS = ("polyline", "center", "source")
+
+
+class Place(NamedTuple):
+    """Typed place record, tuple-backed so it carries no per-instance __dict__.
+
+    Tool results keep places as the for_map() dicts (that is what the caches,
+    the spatial index and the frontend store); for_llm() is the trimmed form
+    sent back to the model.
+    """
+    name: str
+    address: str
+    lat: float
+    lng: float
+    type: str = ""
+    category: str = ""
+    importance: float = 0.0
+    distance_km: Optional[float] = None
+
+    @classmethod
+    def from_nominatim(cls, item: Dict[str, Any]) -> "Place":
+        display_name = item.get("display_name") or ""
+        return cls(
+            name=display_name.split(",")[0],
+            address=display_name,
+            lat=float(item.get("lat", 0)),
+            lng=float(item.get("lon", 0)),
+            type=item.get("type", ""),
+            category=item.get("class", ""),
+            importance=item.get("importance", 0),
+        )
+
+    @classmethod
+    def from_dict(cls, place: Dict[str, Any]) -> "Place":
+        coordinates = place.get("coordinates") or {}
+        return cls(
+            name=place.get("name", ""),
+            address=place.get("address") or "",
+            lat=coordinates.get("lat", 0.0),
+            lng=coordinates.get("lng", 0.0),
+            type=place.get("type", ""),
+            category=place.get("category", ""),
+            importance=place.get("importance", 0),
+            distance_km=place.get("distance_km"),
+        )
+
+    def for_map(self) -> Dict[str, Any]:
+        place = {
+            "name": self.name,
+            "address": self.address,
+            "coordinates": {"lat": self.lat, "lng": self.lng},
+            "type": self.type,
+            "category": self.category,
+            "importance": self.importance,
+        }
+        if self.distance_km is not None:
+            place["distance_km"] = self.distance_km
+        return place
+
+    def for_llm(self) -> Dict[str, Any]:
+        place = {"name": self.name}
+        # Nominatim addresses start with the name; only send the rest
+        address = self.address[len(self.name):].lstrip(", ") if self.address.startswith(self.name) else self.address
+        if address:
+            place["address"] = address
+        if self.type:
+            place["type"] = self.type
+        place["lat"] = round(self.lat, 5)
+        place["lng"] = round(self.lng, 5)
+        if self.distance_km is not None:
+            place["distance_km"] = round(self.distance_km, 2)
+        return place
+
+
+def _round_coordinates(value: Any) -> Any:
+    """Round lat/lng values (also nested, e.g. origin/destination) to 5 decimals (~1 m)"""
+    if isinstance(value, dict):
+        return {
+            key: round(item, 5) if key in ("lat", "lng") and isinstance(item, float) else _round_coordinates(item)
+            for key, item in value.items()
+        }
+    return value
+
+
+def llm_view(result: Dict[str, Any], max_places: int = 10) -> Dict[str, Any]:
+    """Minimal projection of a tool result for the model's context.
+
+    Drops map-only fields (route polylines, search center, ...), trims places
+    to their LLM form and rounds coordinates. The full result stays in map_data.
+    """
+    view = {key: value for key, value in result.items() if key not in MAP_ONLY_FIELDS}
+    if isinstance(view.get("places"), list):
+        places = view["places"]
+        view["places"] = [Place.from_dict(place).for_llm() for place in places[:max_places]]
+        if len(places) > max_places:
+            view["more_places"] = len(places) - max_places
+    if "coordinates" in view:
+        view["coordinates"] = _round_coordinates(view["coordinates"])
+    return view
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON text, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str).decode("utf-8")
+    return json.dumps(value, separators=(",", ":"), default=str)
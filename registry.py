@@ -0,0 +1,213 @@
+import asyncio
+import functools
+import inspect
+import logging
+import typing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_CLASSES = ("async", "thread", "process")
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+class ToolError(Exception):
+    """Raised for calls the registry refuses to run (unknown tool, bad arguments)"""
+
+
+class ToolSpec:
+    """A registered tool: its function, JSON schema and execution limits"""
+
+    def __init__(self, name: str, func: Callable, description: str, parameters: Dict[str, Any],
+                 execution: str, timeout: float, max_concurrency: int):
+        self.name = name
+        self.func = func
+        self.description = description
+        self.parameters = parameters
+        self.execution = execution
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+
+def _json_schema(annotation: Any) -> Tuple[Dict[str, Any], Optional[str]]:
+    """JSON schema for a type hint, plus the description from Annotated[..., "description"]"""
+    description = None
+    if typing.get_origin(annotation) is typing.Annotated:
+        annotation, *extras = typing.get_args(annotation)
+        description = next((extra for extra in extras if isinstance(extra, str)), None)
+
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        # Optional[X] -> X
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        schema, _ = _json_schema(args[0])
+    elif origin is typing.Literal:
+        values = list(typing.get_args(annotation))
+        schema = {"type": _JSON_TYPES.get(type(values[0]), "string"), "enum": values}
+    elif origin in (list, typing.List):
+        item_args = typing.get_args(annotation)
+        schema = {"type": "array"}
+        if item_args:
+            schema["items"], _ = _json_schema(item_args[0])
+    else:
+        schema = {"type": _JSON_TYPES.get(origin or annotation, "string")}
+
+    if description:
+        schema["description"] = description
+    return schema, description
+
+
+def build_parameters_schema(func: Callable) -> Dict[str, Any]:
+    """Derive the JSON "parameters" object from a function's signature and type hints.
+
+    Keyword-only parameters are treated as internal and left out of the schema.
+    """
+    hints = typing.get_type_hints(func, include_extras=True)
+    properties = {}
+    required = []
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind != inspect.Parameter.POSITIONAL_OR_KEYWORD:
+            continue
+        properties[name], _ = _json_schema(hints.get(name, str))
+        if param.default is inspect.Parameter.empty:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
+
+class ToolRegistry:
+    """Single source of truth for LLM tools: schemas, dispatch and isolation.
+
+    Each tool declares an execution class:
+      "async"   - coroutine function awaited on the event loop (I/O-bound work)
+      "thread"  - sync function run in a shared thread pool
+      "process" - sync, picklable top-level function run in a process pool (CPU-bound work)
+    plus a timeout and a cap on how many calls to it may run at once.
+    """
+
+    def __init__(self, thread_workers: int = 8, process_workers: int = 0,
+                 process_initializer: Optional[Callable] = None, process_initargs: tuple = ()):
+        self._tools: Dict[str, ToolSpec] = {}
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.process_initializer = process_initializer
+        self.process_initargs = process_initargs
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def tool(self, name: Optional[str] = None, description: Optional[str] = None, execution: str = "async",
+             timeout: float = 15.0, max_concurrency: int = 4):
+        """Decorator registering a function as a tool; the function itself is returned unchanged"""
+        if execution not in EXECUTION_CLASSES:
+            raise ValueError(f"execution must be one of {EXECUTION_CLASSES}, got '{execution}'")
+
+        def decorator(func: Callable) -> Callable:
+            if (execution == "async") != asyncio.iscoroutinefunction(func):
+                raise TypeError(f"Tool {func.__name__}: execution='{execution}' does not match the function type")
+            tool_name = name or func.__name__
+            self._tools[tool_name] = ToolSpec(
+                name=tool_name,
+                func=func,
+                description=description or (inspect.getdoc(func) or "").split("\n")[0],
+                parameters=build_parameters_schema(func),
+                execution=execution,
+                timeout=timeout,
+                max_concurrency=max_concurrency,
+            )
+            return func
+
+        return decorator
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def get(self, name: str) -> ToolSpec:
+        return self._tools[name]
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """Tool definitions in the format ollama.chat(tools=...) expects"""
+        return [spec.schema for spec in self._tools.values()]
+
+    def functions(self) -> Dict[str, Callable]:
+        return {name: spec.func for name, spec in self._tools.items()}
+
+    async def call(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """Run a tool in its execution class, honouring its concurrency cap and timeout.
+
+        Raises ToolError for unknown tools or missing arguments and
+        asyncio.TimeoutError when the tool exceeds its timeout.
+        """
+        spec = self._tools.get(name)
+        if spec is None:
+            raise ToolError(f"Unknown function: {name}")
+
+        properties = spec.parameters["properties"]
+        unknown = set(arguments) - set(properties)
+        if unknown:
+            logger.warning(f"Ignoring unexpected arguments for {name}: {sorted(unknown)}")
+        kwargs = {key: value for key, value in arguments.items() if key in properties}
+        missing = [key for key in spec.parameters["required"] if key not in kwargs]
+        if missing:
+            raise ToolError(f"Missing required arguments for {name}: {', '.join(missing)}")
+
+        async with spec.semaphore():
+            return await asyncio.wait_for(self._run(spec, kwargs), timeout=spec.timeout)
+
+    async def run_in_pool(self, execution: str, func: Callable, *args: Any) -> Any:
+        """Run a sync function in the thread or process pool (for CPU-heavy steps inside async tools)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(execution), functools.partial(func, *args))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "execution": spec.execution,
+                "timeout": spec.timeout,
+                "max_concurrency": spec.max_concurrency,
+                "in_flight": spec.max_concurrency - spec._semaphore._value if spec._semaphore else 0,
+            }
+            for name, spec in self._tools.items()
+        }
+
+    def shutdown(self) -> None:
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._thread_pool = self._process_pool = None
+
+    async def _run(self, spec: ToolSpec, kwargs: Dict[str, Any]) -> Any:
+        if spec.execution == "async":
+            return await spec.func(**kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(spec.execution), functools.partial(spec.func, **kwargs))
+
+    def _executor(self, execution: str) -> Executor:
+        if execution == "process" and self.process_workers > 0:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    initializer=self.process_initializer,
+                    initargs=self.process_initargs,
+                )
+            return self._process_pool
+        # Thread pool for "thread" work, and for "process" work when no process workers are configured
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="tool")
+        return self._thread_pool
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from geocache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+EmbedFn = Callable[[str], Awaitable[List[float]]]
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache of complete chat responses, with optional embedding-similarity lookup.
+
+    Exact keys cover the normalized conversation, model name and tool schema.
+    When an embed function is given, a miss falls back to comparing the
+    embedding of the latest user message against cached entries that share the
+    same context (earlier history, model and tools); a cosine similarity at or
+    above `similarity_threshold` counts as a hit.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95, embed_fn: Optional[EmbedFn] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn
+
+        # key -> {"expires_at", "context", "slot", "value"}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # rows are unit-length embeddings
+        self._slot_keys: List[Optional[str]] = [None] * max_entries
+        self._slot_context: List[Optional[str]] = [None] * max_entries
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "writes": 0, "embed_errors": 0}
+
+    @staticmethod
+    def make_keys(messages: List[Dict[str, Any]], model: str, tool_schema: Any) -> Tuple[str, str]:
+        """(exact key, context key) for a conversation ending in the new user message"""
+        normalized = [{"role": m["role"], "content": normalize_query(m.get("content") or "")} for m in messages]
+        context = _digest({"history": normalized[:-1], "model": model, "tools": tool_schema})
+        return _digest({"context": context, "message": normalized[-1]}), context
+
+    async def lookup(self, key: str, context: str, text: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[List[float]]]:
+        """Returns (value, "exact"/"semantic"/None, embedding computed for text or None)"""
+        value = self._get_exact(key)
+        if value is not None:
+            return value, "exact", None
+
+        embedding = await self._embed(text)
+        if embedding is not None:
+            value = self._get_similar(context, embedding)
+            if value is not None:
+                return value, "semantic", embedding
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, None, embedding
+
+    async def put(self, key: str, context: str, value: Dict[str, Any], text: str,
+                  embedding: Optional[List[float]] = None) -> None:
+        """Store a response; embedding is computed from text if needed and not given"""
+        if embedding is None and self.embed_fn is not None:
+            embedding = await self._embed(text)
+
+        with self._lock:
+            self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            slot = None
+            if embedding is not None:
+                vector = self._unit(embedding)
+                if self._vectors is None or self._vectors.shape[1] != len(vector):
+                    # First embedding, or the embedding model changed dimensions
+                    self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                slot = self._free_slots.pop()
+                self._vectors[slot] = vector
+                self._slot_keys[slot] = key
+                self._slot_context[slot] = context
+
+            self._entries[key] = {
+                "expires_at": time.time() + self.ttl_seconds,
+                "context": context,
+                "slot": slot,
+                "value": value,
+            }
+            self._stats["writes"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _get_exact(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self._stats["exact_hits"] += 1
+            return entry["value"]
+
+    def _get_similar(self, context: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(embedding):
+                return None
+            candidates = [slot for slot, ctx in enumerate(self._slot_context) if ctx == context]
+            if not candidates:
+                return None
+            scores = self._vectors[candidates] @ self._unit(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+
+            key = self._slot_keys[candidates[best]]
+            entry = self._entries[key]
+            if entry["expires_at"] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self._stats["semantic_hits"] += 1
+            logger.debug("Semantic cache hit (similarity %.3f)", scores[best])
+            return entry["value"]
+
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        if self.embed_fn is None:
+            return None
+        try:
+            return await self.embed_fn(text)
+        except Exception as e:
+            with self._lock:
+                self._stats["embed_errors"] += 1
+            logger.warning(f"Embedding failed, skipping semantic cache: {str(e)}")
+            return None
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry["slot"] is not None:
+            slot = entry["slot"]
+            self._slot_keys[slot] = None
+            self._slot_context[slot] = None
+            self._free_slots.append(slot)
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
@@ -0,0 +1,628 @@
+import heapq
+import logging
+import math
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from osm import iter_osm
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+
+# Cost profiles: speed in km/h per highway type (missing type = not routable)
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "driving": {
+        "speeds": {
+            "motorway": 100, "motorway_link": 60, "trunk": 80, "trunk_link": 50,
+            "primary": 60, "primary_link": 40, "secondary": 50, "secondary_link": 35,
+            "tertiary": 40, "tertiary_link": 30, "unclassified": 30, "residential": 25,
+            "living_street": 10, "service": 15, "road": 25,
+        },
+        "access_tags": ("motorcar", "motor_vehicle", "vehicle", "access"),
+        "oneway_tags": ("oneway",),
+        "use_maxspeed": True,
+    },
+    "walking": {
+        "speeds": {
+            "primary": 5, "primary_link": 5, "secondary": 5, "secondary_link": 5,
+            "tertiary": 5, "tertiary_link": 5, "unclassified": 5, "residential": 5,
+            "living_street": 5, "service": 5, "road": 5, "pedestrian": 5, "footway": 5,
+            "path": 4.5, "track": 4.5, "steps": 2.5, "cycleway": 5, "corridor": 5,
+        },
+        "access_tags": ("foot", "access"),
+        "oneway_tags": (),
+        "use_maxspeed": False,
+    },
+    "bicycling": {
+        "speeds": {
+            "primary": 18, "primary_link": 18, "secondary": 18, "secondary_link": 18,
+            "tertiary": 17, "tertiary_link": 17, "unclassified": 16, "residential": 15,
+            "living_street": 10, "service": 12, "road": 15, "cycleway": 18,
+            "path": 12, "track": 10,
+        },
+        "access_tags": ("bicycle", "vehicle", "access"),
+        "oneway_tags": ("oneway:bicycle", "oneway"),
+        "use_maxspeed": False,
+    },
+}
+
+_DENIED = {"no", "private", "discouraged"}
+_GRANTED = {"yes", "designated", "permissive", "destination"}
+
+
+def _parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    parts = value.split()
+    try:
+        speed = float(parts[0])
+    except ValueError:
+        return None
+    if len(parts) > 1 and parts[1] == "mph":
+        speed *= 1.609
+    return speed if speed > 0 else None
+
+
+def way_speeds(tags: Dict[str, str], profile: Dict[str, Any]) -> Tuple[float, float]:
+    """Forward and backward speed (km/h) for a way under a profile; 0 means not allowed"""
+    speed = profile["speeds"].get(tags.get("highway"))
+
+    for key in profile["access_tags"]:
+        value = tags.get(key)
+        if value in _DENIED:
+            return 0.0, 0.0
+        if value in _GRANTED:
+            # Explicit permission, e.g. foot=yes on a cycleway
+            speed = speed or min(profile["speeds"].values())
+            break
+
+    if not speed:
+        return 0.0, 0.0
+
+    if profile["use_maxspeed"]:
+        maxspeed = _parse_maxspeed(tags.get("maxspeed"))
+        if maxspeed:
+            speed = min(maxspeed, speed * 1.2)
+
+    forward = backward = float(speed)
+    for key in profile["oneway_tags"]:
+        oneway = tags.get(key)
+        if oneway is None:
+            continue
+        if oneway in ("yes", "1", "true"):
+            backward = 0.0
+        elif oneway == "-1":
+            forward = 0.0
+        break
+    else:
+        if profile["oneway_tags"] and (tags.get("junction") == "roundabout" or tags.get("highway") == "motorway"):
+            backward = 0.0
+    return forward, backward
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters; works on scalars or NumPy arrays (degrees)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def haversine_matrix_m(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """N x M great-circle distances in meters between (N, 2) and (M, 2) arrays of [lat, lng]"""
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+    return haversine_m(origins[:, 0:1], origins[:, 1:2], destinations[None, :, 0], destinations[None, :, 1])
+
+
+class ProfileGraph:
+    """CSR adjacency for one travel mode: edges out of node u are targets[indptr[u]:indptr[u+1]]"""
+
+    def __init__(self, indptr: np.ndarray, targets: np.ndarray, weights: np.ndarray,
+                 lengths: np.ndarray, max_speed_mps: float):
+        self.indptr = indptr
+        self.targets = targets
+        self.weights = weights  # travel time in seconds
+        self.lengths = lengths  # meters
+        self.max_speed_mps = max_speed_mps
+
+        has_edge = np.zeros(len(indptr) - 1, dtype=bool)
+        has_edge[np.diff(indptr) > 0] = True
+        has_edge[targets] = True
+        self.routable_nodes = np.flatnonzero(has_edge)
+        self.ch: Optional["ContractionHierarchy"] = None  # set by RoadGraph.build_hierarchies() or load()
+        self._lists = None
+
+    def as_lists(self):
+        """Plain-list copies of the arrays; indexing lists is much faster in the A* inner loop"""
+        if self._lists is None:
+            self._lists = (self.indptr.tolist(), self.targets.tolist(), self.weights.tolist())
+        return self._lists
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy for one ProfileGraph: millisecond queries after an offline build.
+
+    Nodes are contracted one by one (least important first); whenever the only
+    shortest path between two neighbours ran through the removed node, a
+    shortcut edge replaces it. A query is then a bidirectional Dijkstra that
+    only climbs to more important nodes, so it settles a small fraction of the
+    nodes plain A* would. Edges are numbered: original edges map to
+    their ProfileGraph edge (`orig`), shortcuts to the two edges they bypass
+    (`child_a`, `child_b`), so found paths unpack into ProfileGraph edges.
+    """
+
+    # Witness searches give up after settling this many nodes (adds a few unneeded shortcuts)
+    WITNESS_SETTLE_LIMIT = 100
+    # Array attributes, in constructor order (also the .npz key suffixes)
+    ARRAYS = ("up_indptr", "up_edges", "down_indptr", "down_edges", "edge_from", "edge_to",
+              "edge_weight", "orig", "child_a", "child_b")
+
+    def __init__(self, up_indptr: np.ndarray, up_edges: np.ndarray, down_indptr: np.ndarray, down_edges: np.ndarray,
+                 edge_from: np.ndarray, edge_to: np.ndarray, edge_weight: np.ndarray,
+                 orig: np.ndarray, child_a: np.ndarray, child_b: np.ndarray):
+        self.up_indptr = up_indptr      # CSR by tail: edges to a higher-ranked head
+        self.up_edges = up_edges
+        self.down_indptr = down_indptr  # CSR by head: edges from a higher-ranked tail
+        self.down_edges = down_edges
+        self.edge_from = edge_from
+        self.edge_to = edge_to
+        self.edge_weight = edge_weight
+        self.orig = orig                # ProfileGraph edge, or -1 for a shortcut
+        self.child_a = child_a
+        self.child_b = child_b
+        self._lists = None
+
+    @classmethod
+    def build(cls, graph: ProfileGraph) -> "ContractionHierarchy":
+        """Contract every node of `graph`; minutes for a city, so run it offline"""
+        started = time.perf_counter()
+        n = len(graph.indptr) - 1
+        edge_from: List[int] = []
+        edge_to: List[int] = []
+        edge_weight: List[float] = []
+        orig: List[int] = []
+        child_a: List[int] = []
+        child_b: List[int] = []
+        # Remaining graph as node -> {neighbour: cheapest edge id}
+        out_edges: List[Dict[int, int]] = [{} for _ in range(n)]
+        in_edges: List[Dict[int, int]] = [{} for _ in range(n)]
+
+        def add_edge(u: int, v: int, weight: float, original: int, a: int, b: int) -> None:
+            current = out_edges[u].get(v)
+            if current is not None and edge_weight[current] <= weight:
+                return
+            edge_id = len(edge_from)
+            edge_from.append(u)
+            edge_to.append(v)
+            edge_weight.append(weight)
+            orig.append(original)
+            child_a.append(a)
+            child_b.append(b)
+            out_edges[u][v] = edge_id
+            in_edges[v][u] = edge_id
+
+        indptr, targets, weights = graph.as_lists()
+        for u in range(n):
+            for edge in range(indptr[u], indptr[u + 1]):
+                if targets[edge] != u:
+                    add_edge(u, targets[edge], weights[edge], edge, -1, -1)
+
+        # Contracted nodes are removed from the dicts above; their edges move to up/down lists
+        up_list: List[int] = []
+        down_list: List[int] = []
+        deleted_neighbours = [0] * n
+
+        def witness_costs(source: int, skip: int, max_cost: float, targets: Set[int]) -> Dict[int, float]:
+            # Local Dijkstra in the remaining graph without `skip`, until every target is settled
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            remaining = len(targets)
+            while heap and settled < cls.WITNESS_SETTLE_LIMIT:
+                cost, node = heapq.heappop(heap)
+                if cost > dist[node]:
+                    continue
+                if cost > max_cost:
+                    break
+                settled += 1
+                if node in targets:
+                    remaining -= 1
+                    if not remaining:
+                        break
+                for nxt, edge_id in out_edges[node].items():
+                    if nxt == skip:
+                        continue
+                    new_cost = cost + edge_weight[edge_id]
+                    if new_cost < dist.get(nxt, math.inf):
+                        dist[nxt] = new_cost
+                        heapq.heappush(heap, (new_cost, nxt))
+            return dist
+
+        def shortcuts_for(v: int) -> List[Tuple[int, int, float, int, int]]:
+            needed = []
+            outgoing = list(out_edges[v].items())
+            for u, e_in in in_edges[v].items():
+                w_in = edge_weight[e_in]
+                candidates = [(x, e_out, w_in + edge_weight[e_out]) for x, e_out in outgoing if x != u]
+                if not candidates:
+                    continue
+                dist = witness_costs(u, v, max(cost for _, _, cost in candidates), {x for x, _, _ in candidates})
+                for x, e_out, cost in candidates:
+                    if dist.get(x, math.inf) > cost:
+                        needed.append((u, x, cost, e_in, e_out))
+            return needed
+
+        def priority(v: int, shortcuts: List[Tuple[int, int, float, int, int]]) -> int:
+            # Edge difference, plus contracted neighbours to spread contraction evenly over the map
+            return 2 * (len(shortcuts) - len(out_edges[v]) - len(in_edges[v])) + deleted_neighbours[v]
+
+        heap = [(priority(v, shortcuts_for(v)), v) for v in range(n)]
+        heapq.heapify(heap)
+        while heap:
+            _, v = heapq.heappop(heap)
+            # Lazy update: re-queue if the node got more expensive than the next candidate
+            shortcuts = shortcuts_for(v)
+            current = priority(v, shortcuts)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+            for u, x, cost, e_in, e_out in shortcuts:
+                add_edge(u, x, cost, -1, e_in, e_out)
+            # Everything still attached to v leads to a node contracted later, i.e. ranked higher
+            for x, edge_id in out_edges[v].items():
+                up_list.append(edge_id)
+                del in_edges[x][v]
+                deleted_neighbours[x] += 1
+            for u, edge_id in in_edges[v].items():
+                down_list.append(edge_id)
+                del out_edges[u][v]
+                deleted_neighbours[u] += 1
+            out_edges[v] = {}
+            in_edges[v] = {}
+
+        tails = np.array(edge_from, dtype=np.int32)
+        heads = np.array(edge_to, dtype=np.int32)
+        up_edges = np.array(up_list, dtype=np.int64)
+        up_edges = up_edges[np.argsort(tails[up_edges], kind="stable")]
+        down_edges = np.array(down_list, dtype=np.int64)
+        down_edges = down_edges[np.argsort(heads[down_edges], kind="stable")]
+        up_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails[up_edges], minlength=n), out=up_indptr[1:])
+        down_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads[down_edges], minlength=n), out=down_indptr[1:])
+
+        shortcut_count = sum(1 for original in orig if original < 0)
+        logger.info(f"Contracted {n} nodes in {time.perf_counter() - started:.1f}s ({shortcut_count} shortcuts)")
+        return cls(up_indptr, up_edges.astype(np.int32), down_indptr, down_edges.astype(np.int32),
+                   tails, heads, np.array(edge_weight, dtype=np.float64), np.array(orig, dtype=np.int32),
+                   np.array(child_a, dtype=np.int32), np.array(child_b, dtype=np.int32))
+
+    def as_lists(self):
+        """Plain-list copies of the arrays the query loop indexes"""
+        if self._lists is None:
+            self._lists = tuple(getattr(self, name).tolist() for name in self.ARRAYS)
+        return self._lists
+
+    def query(self, src: int, dst: int) -> Optional[Tuple[List[int], List[int]]]:
+        """(nodes, ProfileGraph edges) of the fastest path, or None if dst is unreachable"""
+        (up_indptr, up_edges, down_indptr, down_edges, edge_from, edge_to,
+         edge_weight, orig, child_a, child_b) = self.as_lists()
+        if src == dst:
+            return [src], []
+
+        # Index 0 searches upward from src, index 1 upward (on reversed edges) from dst
+        dist = ({src: 0.0}, {dst: 0.0})
+        parent: Tuple[Dict[int, int], Dict[int, int]] = ({}, {})
+        heaps = ([(0.0, src)], [(0.0, dst)])
+        best, meeting = math.inf, -1
+        while heaps[0] or heaps[1]:
+            # Advance the side with the smaller tentative distance
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            cost, node = heapq.heappop(heaps[side])
+            if cost >= best:
+                heaps[side].clear()  # nothing further on this side can improve the route
+                continue
+            if cost > dist[side][node]:
+                continue
+            other = dist[1 - side].get(node)
+            if other is not None and cost + other < best:
+                best, meeting = cost + other, node
+            if side == 0:
+                indptr, edges, ends = up_indptr, up_edges, edge_to
+                back_indptr, back_edges, back_ends = down_indptr, down_edges, edge_from
+            else:
+                indptr, edges, ends = down_indptr, down_edges, edge_from
+                back_indptr, back_edges, back_ends = up_indptr, up_edges, edge_to
+            # Stall-on-demand: a higher node already reached more cheaply makes this label useless
+            stalled = False
+            for i in range(back_indptr[node], back_indptr[node + 1]):
+                edge_id = back_edges[i]
+                if dist[side].get(back_ends[edge_id], math.inf) + edge_weight[edge_id] < cost:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+            for i in range(indptr[node], indptr[node + 1]):
+                edge_id = edges[i]
+                nxt = ends[edge_id]
+                new_cost = cost + edge_weight[edge_id]
+                if new_cost < dist[side].get(nxt, math.inf):
+                    dist[side][nxt] = new_cost
+                    parent[side][nxt] = edge_id
+                    heapq.heappush(heaps[side], (new_cost, nxt))
+        if meeting < 0:
+            return None
+
+        ch_edges: List[int] = []
+        node = meeting
+        while node != src:
+            edge_id = parent[0][node]
+            ch_edges.append(edge_id)
+            node = edge_from[edge_id]
+        ch_edges.reverse()
+        node = meeting
+        while node != dst:
+            edge_id = parent[1][node]
+            ch_edges.append(edge_id)
+            node = edge_to[edge_id]
+
+        # Unpack shortcuts into the original edges they stand for
+        nodes = [src]
+        path_edges: List[int] = []
+        stack = list(reversed(ch_edges))
+        while stack:
+            edge_id = stack.pop()
+            if orig[edge_id] >= 0:
+                path_edges.append(orig[edge_id])
+                nodes.append(edge_to[edge_id])
+            else:
+                stack.append(child_b[edge_id])
+                stack.append(child_a[edge_id])
+        return nodes, path_edges
+
+
+class RoadGraph:
+    """Array-backed road network with one ProfileGraph per travel mode"""
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, profiles: Dict[str, ProfileGraph]):
+        self.lat = lat
+        self.lon = lon
+        self.profiles = profiles
+        self._rad_lists = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+
+    @classmethod
+    def from_osm(cls, path: str) -> "RoadGraph":
+        """Build the graph from an OSM extract (.osm, .osm.bz2, .osm.gz or .pbf)"""
+        started = time.perf_counter()
+        coords: Dict[int, Tuple[float, float]] = {}
+        ways: List[Tuple[List[int], Dict[str, str]]] = []
+        for kind, osm_id, data, tags in iter_osm(path):
+            if kind == "node":
+                coords[osm_id] = data
+            elif "highway" in tags:
+                ways.append((data, tags))
+
+        # Compact node ids to 0..n-1, keeping only nodes used by routable ways
+        node_index: Dict[int, int] = {}
+        lat_list: List[float] = []
+        lon_list: List[float] = []
+        seg_u: List[int] = []
+        seg_v: List[int] = []
+        seg_way: List[int] = []
+        way_tags: List[Dict[str, str]] = []
+        for refs, tags in ways:
+            indices = []
+            for ref in refs:
+                if ref not in coords:
+                    continue
+                idx = node_index.get(ref)
+                if idx is None:
+                    idx = node_index[ref] = len(lat_list)
+                    lat_list.append(coords[ref][0])
+                    lon_list.append(coords[ref][1])
+                indices.append(idx)
+            if len(indices) < 2:
+                continue
+            way_id = len(way_tags)
+            way_tags.append(tags)
+            seg_u.extend(indices[:-1])
+            seg_v.extend(indices[1:])
+            seg_way.extend([way_id] * (len(indices) - 1))
+        del coords
+
+        lat = np.array(lat_list, dtype=np.float64)
+        lon = np.array(lon_list, dtype=np.float64)
+        u = np.array(seg_u, dtype=np.int32)
+        v = np.array(seg_v, dtype=np.int32)
+        seg_way_arr = np.array(seg_way, dtype=np.int32)
+        seg_len = haversine_m(lat[u], lon[u], lat[v], lon[v]).astype(np.float32)
+
+        profiles = {}
+        for name, profile in PROFILES.items():
+            speeds = np.array([way_speeds(tags, profile) for tags in way_tags], dtype=np.float32).reshape(-1, 2)
+            fwd = speeds[seg_way_arr, 0] if len(seg_way_arr) else np.zeros(0, np.float32)
+            bwd = speeds[seg_way_arr, 1] if len(seg_way_arr) else np.zeros(0, np.float32)
+            f_mask = fwd > 0
+            b_mask = bwd > 0
+            src = np.concatenate([u[f_mask], v[b_mask]])
+            dst = np.concatenate([v[f_mask], u[b_mask]])
+            lengths = np.concatenate([seg_len[f_mask], seg_len[b_mask]])
+            kmh = np.concatenate([fwd[f_mask], bwd[b_mask]])
+            profiles[name] = cls._build_csr(len(lat), src, dst, lengths, kmh)
+
+        logger.info(f"Built road graph from {path}: {len(lat)} nodes, "
+                    f"{len(u)} segments in {time.perf_counter() - started:.1f}s")
+        return cls(lat, lon, profiles)
+
+    @staticmethod
+    def _build_csr(n: int, src: np.ndarray, dst: np.ndarray, lengths: np.ndarray, kmh: np.ndarray) -> ProfileGraph:
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        weights = (lengths / (kmh / 3.6)).astype(np.float32)
+        max_speed = float(kmh.max()) / 3.6 if len(kmh) else 1.0
+        return ProfileGraph(indptr, dst[order].astype(np.int32), weights[order], lengths[order], max_speed)
+
+    def save(self, path: str) -> None:
+        """Write the graph to a compressed .npz file for fast startup"""
+        arrays = {"lat": self.lat, "lon": self.lon}
+        for name, graph in self.profiles.items():
+            arrays[f"{name}__indptr"] = graph.indptr
+            arrays[f"{name}__targets"] = graph.targets
+            arrays[f"{name}__weights"] = graph.weights
+            arrays[f"{name}__lengths"] = graph.lengths
+            arrays[f"{name}__max_speed"] = np.array([graph.max_speed_mps])
+            if graph.ch is not None:
+                for key in ContractionHierarchy.ARRAYS:
+                    arrays[f"{name}__ch_{key}"] = getattr(graph.ch, key)
+        np.savez_compressed(path, **arrays)
+        logger.info(f"Saved road graph to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """Load a graph written by save(), or build one if given an OSM extract"""
+        if not path.endswith(".npz"):
+            return cls.from_osm(path)
+        with np.load(path) as data:
+            profiles = {}
+            for name in PROFILES:
+                if f"{name}__indptr" not in data:
+                    continue
+                profiles[name] = ProfileGraph(
+                    data[f"{name}__indptr"], data[f"{name}__targets"], data[f"{name}__weights"],
+                    data[f"{name}__lengths"], float(data[f"{name}__max_speed"][0])
+                )
+                if f"{name}__ch_orig" in data:
+                    profiles[name].ch = ContractionHierarchy(*(data[f"{name}__ch_{key}"] for key in ContractionHierarchy.ARRAYS))
+                    profiles[name].ch.as_lists()  # convert now rather than in the first request
+            graph = cls(data["lat"], data["lon"], profiles)
+        missing = [name for name, profile in profiles.items() if profile.ch is None]
+        if missing:
+            logger.warning(f"Road graph {path} has no contraction hierarchy for {', '.join(missing)}; "
+                           f"those modes fall back to A*, which is much slower on large graphs")
+        logger.info(f"Loaded road graph from {path}: {graph.node_count} nodes")
+        return graph
+
+    def build_hierarchies(self) -> None:
+        """Contract every profile graph (slow; done once when writing the .npz)"""
+        for graph in self.profiles.values():
+            graph.ch = ContractionHierarchy.build(graph)
+
+    def nearest_node(self, lat: float, lng: float, mode: str) -> Tuple[int, float]:
+        """Snap a coordinate to the closest node routable in `mode`; returns (node, distance in meters)"""
+        candidates = self.profiles[mode].routable_nodes
+        if len(candidates) == 0:
+            raise ValueError(f"No routable roads for mode '{mode}'")
+        # Equirectangular approximation is accurate enough to pick the closest node
+        dlat = self.lat[candidates] - lat
+        dlon = (self.lon[candidates] - lng) * math.cos(math.radians(lat))
+        best = candidates[int(np.argmin(dlat * dlat + dlon * dlon))]
+        return int(best), float(haversine_m(lat, lng, self.lat[best], self.lon[best]))
+
+    def route(self, origin: Dict[str, float], destination: Dict[str, float], mode: str = "driving") -> Optional[Dict[str, Any]]:
+        """Shortest-time route between two {"lat", "lng"} points, or None if they are not connected"""
+        if mode not in self.profiles:
+            raise ValueError(f"Unknown travel mode '{mode}'")
+        graph = self.profiles[mode]
+        src, src_snap = self.nearest_node(origin["lat"], origin["lng"], mode)
+        dst, dst_snap = self.nearest_node(destination["lat"], destination["lng"], mode)
+
+        path = graph.ch.query(src, dst) if graph.ch is not None else self._astar(graph, src, dst)
+        if path is None:
+            return None
+
+        nodes, edges = path
+        edges_arr = np.array(edges, dtype=np.int64)
+        distance_m = float(graph.lengths[edges_arr].sum()) if edges else 0.0
+        duration_s = float(graph.weights[edges_arr].sum()) if edges else 0.0
+        polyline = [[round(float(self.lat[n]), 6), round(float(self.lon[n]), 6)] for n in nodes]
+        # Connect the requested points to the snapped road nodes
+        if src_snap > 1:
+            polyline.insert(0, [origin["lat"], origin["lng"]])
+        if dst_snap > 1:
+            polyline.append([destination["lat"], destination["lng"]])
+        return {
+            "distance_m": distance_m,
+            "duration_s": duration_s,
+            "snap_distance_m": max(src_snap, dst_snap),
+            "polyline": polyline,
+        }
+
+    def _astar(self, graph: ProfileGraph, src: int, dst: int) -> Optional[Tuple[List[int], List[int]]]:
+        indptr, targets, weights = graph.as_lists()
+        if self._rad_lists is None:
+            self._rad_lists = (np.radians(self.lat).tolist(), np.radians(self.lon).tolist())
+        lat_r, lon_r = self._rad_lists
+        dst_lat, dst_lon, cos_dst = lat_r[dst], lon_r[dst], math.cos(lat_r[dst])
+        inv_speed = 1.0 / graph.max_speed_mps
+        sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+
+        def heuristic(n: int) -> float:
+            # Straight-line distance at the profile's top speed never overestimates
+            a = sin((dst_lat - lat_r[n]) / 2) ** 2 + cos(lat_r[n]) * cos_dst * sin((dst_lon - lon_r[n]) / 2) ** 2
+            return 2 * EARTH_RADIUS_M * asin(sqrt(min(1.0, a))) * inv_speed
+
+        best = {src: 0.0}
+        came_from: Dict[int, Tuple[int, int]] = {}
+        heap = [(heuristic(src), 0.0, src)]
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == dst:
+                break
+            if cost > best[node]:
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                nxt = targets[edge]
+                new_cost = cost + weights[edge]
+                if new_cost < best.get(nxt, math.inf):
+                    best[nxt] = new_cost
+                    came_from[nxt] = (node, edge)
+                    heapq.heappush(heap, (new_cost + heuristic(nxt), new_cost, nxt))
+        else:
+            return None
+
+        nodes = [dst]
+        edges = []
+        while nodes[-1] != src:
+            prev, edge = came_from[nodes[-1]]
+            nodes.append(prev)
+            edges.append(edge)
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+
+# Process-pool workers each hold their own copy of the graph
+_worker_graph: Optional[RoadGraph] = None
+
+
+def init_route_worker(path: str) -> None:
+    """ProcessPoolExecutor initializer: load the road graph once per worker process"""
+    global _worker_graph
+    _worker_graph = RoadGraph.load(path)
+
+
+def route_in_worker(origin: Dict[str, float], destination: Dict[str, float], mode: str) -> Optional[Dict[str, Any]]:
+    """RoadGraph.route on the worker's graph (picklable entry point for process pools)"""
+    if _worker_graph is None:
+        raise RuntimeError("Route worker has no road graph loaded")
+    return _worker_graph.route(origin, destination, mode)
+
+
+if __name__ == "__main__":
+    # python routing.py city.osm.pbf city-graph.npz
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 3:
+        print("Usage: python routing.py <extract.osm|.osm.bz2|.pbf> <output.npz>")
+        sys.exit(1)
+    road_graph = RoadGraph.from_osm(sys.argv[1])
+    road_graph.build_hierarchies()
+    road_graph.save(sys.argv[2])
@@ -0,0 +1,275 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+MAX_SUMMARY_LINES = 20
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Cheap token estimate (~4 characters per token plus per-message overhead)"""
+    total = 0
+    for message in messages:
+        total += 4 + len(message.get("content") or "") // 4
+        if message.get("tool_calls"):
+            total += len(json.dumps(message["tool_calls"], default=str)) // 4
+    return total
+
+
+def shrink_json(value: Any, max_items: int = 3, max_chars: int = 120, depth: int = 0) -> Any:
+    """Trim a tool result for re-use as context: short lists, short strings, bounded nesting"""
+    if isinstance(value, dict):
+        if depth >= 3:
+            return "{...}"
+        return {key: shrink_json(item, max_items, max_chars, depth + 1) for key, item in value.items()}
+    if isinstance(value, list):
+        if depth >= 3:
+            return f"[{len(value)} items]"
+        trimmed = [shrink_json(item, max_items, max_chars, depth + 1) for item in value[:max_items]]
+        if len(value) > max_items:
+            trimmed.append(f"... {len(value) - max_items} more")
+        return trimmed
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "..."
+    return value
+
+
+def _split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group messages into turns, each starting at a user message"""
+    turns: List[List[Dict[str, Any]]] = []
+    for message in messages:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _shrink_turn(turn: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    shrunk = []
+    for message in turn:
+        if message["role"] == "tool":
+            try:
+                content = json.dumps(shrink_json(json.loads(message["content"])))
+            except (TypeError, ValueError):
+                content = message["content"][:200]
+            message = dict(message, content=content)
+        shrunk.append(message)
+    return shrunk
+
+
+def _summarize_turn(turn: List[Dict[str, Any]]) -> str:
+    user = next((m["content"] for m in turn if m["role"] == "user"), "")
+    answer = next((m["content"] for m in reversed(turn) if m["role"] == "assistant" and m.get("content")), "")
+    tools = [call["function"]["name"] for m in turn for call in (m.get("tool_calls") or [])]
+    line = f"- User: {user[:150]}"
+    if tools:
+        line += f" [tools: {', '.join(tools)}]"
+    if answer:
+        line += f" -> Assistant: {answer[:200]}"
+    return line
+
+
+def compact_messages(messages: List[Dict[str, Any]], token_budget: int, keep_recent_turns: int = 2) -> List[Dict[str, Any]]:
+    """Fit a history into token_budget, returning a new list (or the same one if it already fits).
+
+    Compaction goes down to half the budget, so the following turns only append
+    to an unchanged prefix (which the model server can reuse) until the budget
+    is reached again. Older turns first lose their bulky tool JSON, then the
+    oldest turns are folded into a summary message at the start.
+    """
+    if estimate_tokens(messages) <= token_budget:
+        return messages
+    target = token_budget // 2
+
+    summary_lines: List[str] = []
+    if messages and messages[0]["role"] == "system" and messages[0]["content"].startswith(SUMMARY_HEADER):
+        summary_lines = messages[0]["content"].split("\n")[1:]
+        messages = messages[1:]
+
+    turns = _split_turns(messages)
+    keep = max(keep_recent_turns, 1)
+    older = [_shrink_turn(turn) for turn in turns[:-keep]]
+    recent = turns[-keep:]
+
+    def assemble() -> List[Dict[str, Any]]:
+        lines = summary_lines[-MAX_SUMMARY_LINES:]
+        prefix = [{"role": "system", "content": "\n".join([SUMMARY_HEADER] + lines)}] if lines else []
+        return prefix + [message for turn in older + recent for message in turn]
+
+    while older and estimate_tokens(assemble()) > target:
+        summary_lines.append(_summarize_turn(older.pop(0)))
+    # Still too long: fold recent turns too, and finally trim the latest one's tool output
+    while len(recent) > 1 and estimate_tokens(assemble()) > target:
+        summary_lines.append(_summarize_turn(recent.pop(0)))
+    if estimate_tokens(assemble()) > target:
+        recent = [_shrink_turn(turn) for turn in recent]
+
+    compacted = assemble()
+    if logger.isEnabledFor(logging.DEBUG):
+        # estimate_tokens re-serializes the history: only pay for it when the line is logged
+        logger.debug("Compacted history from %d to %d messages (~%d tokens, budget %d)",
+                     len(messages), len(compacted), estimate_tokens(compacted), token_budget)
+    return compacted
+
+
+class SessionStore:
+    """Conversation sessions, so clients need not resend their history.
+
+    Each session keeps its messages, including earlier tool calls and results.
+    Histories are compacted with compact_messages whenever they outgrow
+    `token_budget`. Sessions idle for longer than `ttl_seconds` expire, and the
+    least recently used ones are evicted beyond `max_sessions`. Sessions live
+    in memory, or in the SQLite file at `path` when several worker processes
+    must see the same sessions.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 6 * 3600,
+                 token_budget: int = 2048, keep_recent_turns: int = 2, path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        # session id -> {"messages", "updated_at"}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "resumed": 0, "expired": 0, "evicted": 0, "compactions": 0}
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " messages TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            logger.info(f"Sessions stored in '{path}'")
+
+    def history(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """The session's messages, or None if it is unknown or expired"""
+        with self._lock:
+            session = self._load(session_id)
+            if session is None:
+                return None
+            if session["updated_at"] + self.ttl_seconds <= time.time():
+                self._drop(session_id)
+                self._stats["expired"] += 1
+                return None
+            if self._conn is None:
+                self._sessions.move_to_end(session_id)
+            self._stats["resumed"] += 1
+            return list(session["messages"])
+
+    def create(self, messages: Optional[List[Dict[str, Any]]] = None, session_id: Optional[str] = None) -> str:
+        """Start a session (optionally seeded with a history) and return its id"""
+        session_id = session_id or uuid.uuid4().hex
+        messages = self.compact(list(messages or []))
+        with self._lock:
+            self._save(session_id, messages)
+            self._stats["evicted"] += self._evict()
+            self._stats["created"] += 1
+        return session_id
+
+    def append(self, session_id: str, messages: List[Any]) -> None:
+        """Add one turn's messages (dicts or pydantic message objects), compacting if needed"""
+        new_messages = [m if isinstance(m, dict) else m.model_dump(exclude_none=True) for m in messages]
+        # Read, compact and write as one step: concurrent turns on the same session
+        # (or, with SQLite, in other workers) must not overwrite each other's messages
+        with self._transaction():
+            session = self._load(session_id)
+            history = [] if session is None else session["messages"]
+            self._save(session_id, self._compact(history + new_messages))
+
+    def compact(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        compacted = compact_messages(messages, self.token_budget, self.keep_recent_turns)
+        if compacted is not messages:
+            with self._lock:
+                self._stats["compactions"] += 1
+        return compacted
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._drop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            if self._conn is None:
+                stats["sessions"] = len(self._sessions)
+            else:
+                stats["sessions"] = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return stats
+
+    # Storage helpers; callers hold self._lock
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold the lock, and with SQLite a write transaction, for a read-modify-write"""
+        with self._lock:
+            if self._conn is None:
+                yield
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _compact(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """compact() for callers that already hold self._lock"""
+        compacted = compact_messages(messages, self.token_budget, self.keep_recent_turns)
+        if compacted is not messages:
+            self._stats["compactions"] += 1
+        return compacted
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if self._conn is None:
+            return self._sessions.get(session_id)
+        row = self._conn.execute(
+            "SELECT messages, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"messages": json.loads(row[0]), "updated_at": row[1]}
+
+    def _save(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        if self._conn is None:
+            self._sessions[session_id] = {"messages": messages, "updated_at": time.time()}
+            self._sessions.move_to_end(session_id)
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, messages, updated_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(messages, default=str), time.time()),
+        )
+
+    def _drop(self, session_id: str) -> bool:
+        if self._conn is None:
+            return self._sessions.pop(session_id, None) is not None
+        return self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def _evict(self) -> int:
+        """Remove the least recently used sessions beyond max_sessions and return how many"""
+        if self._conn is None:
+            evicted = 0
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                evicted += 1
+            return evicted
+        return self._conn.execute(
+            "DELETE FROM sessions WHERE session_id NOT IN"
+            " (SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT ?)",
+            (self.max_sessions,),
+        ).rowcount
@@ -0,0 +1,224 @@
+import json
+import logging
+import math
+import sys
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from osm import iter_osm
+from routing import haversine_m
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE_LAT = 111.32
+
+# OSM keys whose value is a useful place type (amenity=cafe, shop=bakery, ...)
+POI_KEYS = ("amenity", "shop", "tourism", "leisure", "historic", "office", "craft", "healthcare")
+
+
+def normalize_type(place_type: str) -> str:
+    """'Coffee Shops' -> 'coffee_shop', matching OSM tag value spelling"""
+    text = "_".join((place_type or "").strip().lower().split())
+    if text.endswith("ies"):
+        return text[:-3] + "y"
+    if text.endswith("s") and not text.endswith(("ss", "us")):
+        return text[:-1]
+    return text
+
+
+class PlaceIndex:
+    """Grid-bucketed spatial index of places over NumPy coordinate arrays.
+
+    Places are bucketed into square cells of `cell_deg` degrees; a query only
+    looks at the cells overlapping its radius and filters those candidates with
+    a vectorized haversine. Places can be added at any time, so results from
+    remote searches accumulate into the index.
+    """
+
+    def __init__(self, cell_deg: float = 0.01, max_places: int = 1_000_000):
+        self.cell_deg = cell_deg
+        self.max_places = max_places
+        self._lat = np.zeros(1024, dtype=np.float64)
+        self._lon = np.zeros(1024, dtype=np.float64)
+        self._type_ids = np.zeros(1024, dtype=np.int32)
+        self._category_ids = np.zeros(1024, dtype=np.int32)
+        self._records: List[Dict[str, Any]] = []
+        self._cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._vocab: Dict[str, int] = {"": 0}
+        self._seen: set = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, place: Dict[str, Any]) -> bool:
+        """Add a place dict (as returned by search_places); returns False for duplicates"""
+        coords = place.get("coordinates") or {}
+        lat, lng = coords.get("lat"), coords.get("lng")
+        if lat is None or lng is None:
+            return False
+        dedupe_key = (round(lat, 5), round(lng, 5), place.get("name", ""))
+        with self._lock:
+            if dedupe_key in self._seen or len(self._records) >= self.max_places:
+                return False
+            self._seen.add(dedupe_key)
+
+            i = len(self._records)
+            if i == len(self._lat):
+                self._grow()
+            self._lat[i] = lat
+            self._lon[i] = lng
+            self._type_ids[i] = self._term_id(place.get("type", ""))
+            self._category_ids[i] = self._term_id(place.get("category", ""))
+            self._records.append(place)
+            self._cells[self._cell(lat, lng)].append(i)
+            return True
+
+    def add_many(self, places: List[Dict[str, Any]]) -> int:
+        return sum(1 for place in places if self.add(place))
+
+    def places(self) -> List[Dict[str, Any]]:
+        """All indexed places, in insertion order"""
+        with self._lock:
+            return list(self._records)
+
+    def query_radius(self, lat: float, lng: float, radius_km: float,
+                     place_type: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Places within radius_km of a point, nearest first, each with a distance_km field"""
+        with self._lock:
+            candidates = self._candidates(lat, lng, radius_km)
+            if len(candidates) == 0:
+                return []
+            if place_type:
+                candidates = candidates[self._type_mask(candidates, place_type)]
+            distances_km = haversine_m(lat, lng, self._lat[candidates], self._lon[candidates]) / 1000
+            inside = distances_km <= radius_km
+            candidates, distances_km = candidates[inside], distances_km[inside]
+            order = np.argsort(distances_km, kind="stable")
+            if limit is not None:
+                order = order[:limit]
+            return [
+                dict(self._records[candidates[j]], distance_km=round(float(distances_km[j]), 3))
+                for j in order
+            ]
+
+    def nearest(self, lat: float, lng: float, k: int = 5, place_type: Optional[str] = None,
+                max_radius_km: float = 50) -> List[Dict[str, Any]]:
+        """The k nearest places, searching outward in growing rings up to max_radius_km"""
+        radius_km = max(self.cell_deg * KM_PER_DEGREE_LAT, 0.5)
+        while True:
+            results = self.query_radius(lat, lng, radius_km, place_type, limit=k)
+            if len(results) >= k or radius_km >= max_radius_km:
+                return results
+            radius_km = min(radius_km * 2, max_radius_km)
+
+    def save(self, path: str) -> None:
+        """Write the index to an .npz file"""
+        with self._lock:
+            n = len(self._records)
+            np.savez_compressed(
+                path, lat=self._lat[:n], lon=self._lon[:n],
+                records=np.frombuffer(json.dumps(self._records).encode("utf-8"), dtype=np.uint8)
+            )
+        logger.info(f"Saved place index with {n} places to {path}")
+
+    @classmethod
+    def load(cls, path: str, cell_deg: float = 0.01, max_places: int = 1_000_000) -> "PlaceIndex":
+        """Load an index written by save(), or build one if given an OSM extract"""
+        if not path.endswith(".npz"):
+            return cls.from_osm(path, cell_deg, max_places)
+        index = cls(cell_deg, max_places)
+        with np.load(path) as data:
+            records = json.loads(data["records"].tobytes().decode("utf-8"))
+        index.add_many(records)
+        logger.info(f"Loaded place index with {len(index)} places from {path}")
+        return index
+
+    @classmethod
+    def from_osm(cls, path: str, cell_deg: float = 0.01, max_places: int = 1_000_000) -> "PlaceIndex":
+        """Index named POI nodes (amenity, shop, tourism, ...) from an OSM extract"""
+        index = cls(cell_deg, max_places)
+        for kind, _, data, tags in iter_osm(path):
+            if kind != "node" or "name" not in tags:
+                continue
+            for key in POI_KEYS:
+                if key in tags:
+                    index.add(place_from_osm_tags(data[0], data[1], tags, key))
+                    break
+        logger.info(f"Indexed {len(index)} places from {path}")
+        return index
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def _candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        lat_lo, lng_lo = self._cell(lat - dlat, lng - dlng)
+        lat_hi, lng_hi = self._cell(lat + dlat, lng + dlng)
+
+        cell_count = (lat_hi - lat_lo + 1) * (lng_hi - lng_lo + 1)
+        if cell_count > len(self._cells):
+            # Huge radius: scanning occupied cells is cheaper than enumerating the box
+            lists = [
+                bucket for (ci, cj), bucket in self._cells.items()
+                if lat_lo <= ci <= lat_hi and lng_lo <= cj <= lng_hi
+            ]
+        else:
+            lists = [
+                self._cells[(ci, cj)]
+                for ci in range(lat_lo, lat_hi + 1)
+                for cj in range(lng_lo, lng_hi + 1)
+                if (ci, cj) in self._cells
+            ]
+        if not lists:
+            return np.zeros(0, dtype=np.int64)
+        return np.fromiter((i for bucket in lists for i in bucket), dtype=np.int64)
+
+    def _type_mask(self, candidates: np.ndarray, place_type: str) -> np.ndarray:
+        wanted = normalize_type(place_type)
+        ids = [term_id for term, term_id in self._vocab.items() if term and (term == wanted or normalize_type(term) == wanted)]
+        if not ids:
+            return np.zeros(len(candidates), dtype=bool)
+        return np.isin(self._type_ids[candidates], ids) | np.isin(self._category_ids[candidates], ids)
+
+    def _term_id(self, term: str) -> int:
+        term = (term or "").lower()
+        term_id = self._vocab.get(term)
+        if term_id is None:
+            term_id = self._vocab[term] = len(self._vocab)
+        return term_id
+
+    def _grow(self) -> None:
+        size = len(self._lat) * 2
+        for name in ("_lat", "_lon", "_type_ids", "_category_ids"):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+
+def place_from_osm_tags(lat: float, lng: float, tags: Dict[str, str], key: str) -> Dict[str, Any]:
+    """Build a place dict shaped like search_places results from OSM node tags"""
+    street = " ".join(filter(None, [tags.get("addr:housenumber"), tags.get("addr:street")]))
+    address = ", ".join(filter(None, [tags["name"], street, tags.get("addr:city")]))
+    return {
+        "name": tags["name"],
+        "address": address,
+        "coordinates": {"lat": lat, "lng": lng},
+        "type": tags[key],
+        "category": key,
+        "importance": 0,
+    }
+
+
+if __name__ == "__main__":
+    # python spatial.py city.osm.pbf city-places.npz
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 3:
+        print("Usage: python spatial.py <extract.osm|.osm.bz2|.pbf> <output.npz>")
+        sys.exit(1)
+    PlaceIndex.from_osm(sys.argv[1]).save(sys.argv[2])
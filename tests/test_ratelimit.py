@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from ratelimit import PRIORITY_BATCH, PRIORITY_INTERACTIVE, OutboundScheduler, QueueFullError, TokenBucket
+
+
+def paused_scheduler(max_queue_size: int = 100) -> OutboundScheduler:
+    """A fast scheduler that holds everything back for 0.1s, so tests can queue up requests first"""
+    bucket = TokenBucket(1000.0, 1.0)
+    bucket.pause(0.1)
+    return OutboundScheduler(bucket=bucket, max_queue_size=max_queue_size)
+
+
+def recording_request(calls, name, result=None):
+    async def request():
+        calls.append(name)
+        return result if result is not None else name
+    return request
+
+
+async def settle():
+    # Let newly created tasks reach their first await
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_identical_requests_share_one_call():
+    async def main():
+        scheduler = paused_scheduler()
+        calls = []
+        results = await asyncio.gather(*[
+            scheduler.submit("same", recording_request(calls, "same")) for _ in range(5)
+        ])
+        assert results == ["same"] * 5
+        assert calls == ["same"]
+        stats = scheduler.stats()
+        assert stats["upstream_calls"] == 1
+        assert stats["coalesced"] == 4
+        assert stats["inflight"] == 0
+
+    asyncio.run(main())
+
+
+def test_joining_interactive_caller_raises_priority():
+    async def main():
+        scheduler = paused_scheduler()
+        calls = []
+        batch = asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "shared"), PRIORITY_BATCH))
+        await settle()
+        other = asyncio.ensure_future(scheduler.submit("other", recording_request(calls, "other"), PRIORITY_INTERACTIVE))
+        await settle()
+        joined = asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "ignored"), PRIORITY_INTERACTIVE))
+        later = asyncio.ensure_future(scheduler.submit("later", recording_request(calls, "later"), PRIORITY_INTERACTIVE))
+        await asyncio.gather(batch, other, joined, later)
+        # The shared request now queues as interactive, ahead of interactive requests that came after it
+        assert calls == ["shared", "other", "later"]
+        assert joined.result() == "shared"
+
+    asyncio.run(main())
+
+
+def test_full_queue_sheds_lowest_priority_first():
+    async def main():
+        scheduler = paused_scheduler(max_queue_size=2)
+        calls = []
+        batch = [
+            asyncio.ensure_future(scheduler.submit(f"batch-{i}", recording_request(calls, f"batch-{i}"), PRIORITY_BATCH))
+            for i in range(2)
+        ]
+        await settle()
+        interactive = asyncio.ensure_future(scheduler.submit("interactive", recording_request(calls, "interactive")))
+        await settle()
+        extra_batch = asyncio.ensure_future(scheduler.submit("batch-2", recording_request(calls, "batch-2"), PRIORITY_BATCH))
+        results = await asyncio.gather(*batch, interactive, extra_batch, return_exceptions=True)
+
+        assert results[0] == "batch-0"
+        assert isinstance(results[1], QueueFullError)  # newest batch entry made room
+        assert results[2] == "interactive"
+        assert isinstance(results[3], QueueFullError)  # nothing below batch priority to evict
+        assert calls == ["interactive", "batch-0"]
+
+    asyncio.run(main())
+
+
+def test_coalesced_interactive_caller_is_not_shed_with_batch_entry():
+    async def main():
+        scheduler = paused_scheduler(max_queue_size=1)
+        calls = []
+        batch = asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "shared"), PRIORITY_BATCH))
+        await settle()
+        joined = asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "ignored")))
+        await settle()
+        newcomer = asyncio.ensure_future(scheduler.submit("newcomer", recording_request(calls, "newcomer")))
+        results = await asyncio.gather(batch, joined, newcomer, return_exceptions=True)
+
+        assert results[:2] == ["shared", "shared"]
+        assert isinstance(results[2], QueueFullError)
+
+    asyncio.run(main())
+
+
+def test_cancelled_owner_hands_request_to_remaining_waiters():
+    async def main():
+        scheduler = paused_scheduler()
+        calls = []
+        owner = asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "shared"), PRIORITY_BATCH))
+        await settle()
+        joined = asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "ignored")))
+        await settle()
+        owner.cancel()
+        assert await joined == "shared"
+        assert owner.cancelled()
+        assert calls == ["shared"]
+
+    asyncio.run(main())
+
+
+def test_request_is_dropped_once_every_caller_gave_up():
+    async def main():
+        scheduler = paused_scheduler()
+        calls = []
+        waiters = [asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "shared"))) for _ in range(3)]
+        await settle()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert scheduler.stats()["inflight"] == 0
+
+        # The key is free again: a new caller gets a fresh request instead of the cancelled one
+        assert await scheduler.submit("shared", recording_request(calls, "fresh")) == "fresh"
+        assert calls == ["fresh"]
+
+    asyncio.run(main())
+
+
+def test_owner_timeout_does_not_fail_coalesced_callers():
+    async def main():
+        scheduler = paused_scheduler()
+        calls = []
+        probe = asyncio.ensure_future(asyncio.wait_for(scheduler.submit("shared", recording_request(calls, "shared")), 0.01))
+        await settle()
+        joined = asyncio.ensure_future(scheduler.submit("shared", recording_request(calls, "ignored")))
+        with pytest.raises(asyncio.TimeoutError):
+            await probe
+        assert await joined == "shared"
+
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+import threading
+
+from sessions import SessionStore
+
+
+def append_concurrently(stores, session_id, turns_per_thread=20):
+    def worker(store, thread_index):
+        for turn in range(turns_per_thread):
+            store.append(session_id, [{"role": "user", "content": f"{thread_index}-{turn}"}])
+
+    threads = [threading.Thread(target=worker, args=(store, i)) for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_appends_keep_every_turn():
+    store = SessionStore(token_budget=1_000_000)
+    session_id = store.create()
+    append_concurrently([store] * 4, session_id)
+    assert len(store.history(session_id)) == 80
+
+
+def test_concurrent_appends_across_workers_keep_every_turn(tmp_path):
+    # Two stores on one file stand in for two worker processes
+    path = str(tmp_path / "sessions.sqlite3")
+    stores = [SessionStore(token_budget=1_000_000, path=path) for _ in range(2)]
+    session_id = stores[0].create()
+    append_concurrently(stores * 2, session_id)
+    history = stores[1].history(session_id)
+    assert len(history) == 80
+    assert {message["content"] for message in history} == {f"{i}-{turn}" for i in range(4) for turn in range(20)}
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying (429 is handled by the rate limiter pausing instead)
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+
+RequestFn = Callable[[], Awaitable[httpx.Response]]
+Gate = Callable[[RequestFn], Awaitable[httpx.Response]]
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised without contacting the upstream because every endpoint's circuit is open"""
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in TRANSIENT_STATUSES
+    return isinstance(error, httpx.TransportError)  # timeouts, connection errors, ...
+
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, then lets a single trial request through.
+
+    closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open once `reset_timeout` seconds have passed; the half-open trial
+    closes the circuit on success or re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            return True
+        # Open, or half-open with the trial request already in flight
+        return False
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("Circuit closed")
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+                logger.warning(f"Circuit opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def cancel_trial(self) -> None:
+        if self.state == "half_open":
+            self.state = "open"  # opened_at is already past the reset timeout: the next call retries
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+
+class Endpoint:
+    def __init__(self, name: str, base_url: str, breaker: CircuitBreaker):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.breaker = breaker
+
+
+class UpstreamClient:
+    """GET-JSON client for one logical upstream with retries, hedging and circuit breaking.
+
+    Requests go to the primary endpoint (through `gate`, e.g. a rate limiter,
+    when given). If a secondary endpoint is configured it is used when the
+    primary fails or its circuit is open, and, with `hedge_delay`, also when
+    the primary has not answered within that many seconds; the first good
+    answer wins and the other request is cancelled. Transient failures are
+    retried with full-jitter exponential backoff.
+    """
+
+    def __init__(self, name: str, get_client: Callable[[], httpx.AsyncClient], primary_url: str,
+                 secondary_url: Optional[str] = None, retries: int = 2, backoff_base: float = 0.25,
+                 backoff_max: float = 2.0, hedge_delay: Optional[float] = None,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.get_client = get_client
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.endpoints = [Endpoint(name, primary_url, CircuitBreaker(failure_threshold, reset_timeout))]
+        if secondary_url:
+            self.endpoints.append(Endpoint(f"{name}_secondary", secondary_url, CircuitBreaker(failure_threshold, reset_timeout)))
+        self._stats = {"requests": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "fast_failures": 0}
+
+    async def get_json(self, path: str, params: Dict[str, Any], timeout: float, gate: Optional[Gate] = None) -> Any:
+        """GET path with params and return the decoded JSON body"""
+        self._stats["requests"] += 1
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                self._stats["retries"] += 1
+                metrics.count_retry(self.name)
+                await asyncio.sleep(delay)
+            try:
+                response = await self._hedged(path, params, timeout, gate)
+                return response.json()
+            except Exception as e:
+                if attempt == self.retries or not is_transient(e):
+                    raise
+                logger.warning(f"{self.name} request failed ({type(e).__name__}: {e}), retrying")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        for endpoint in self.endpoints:
+            stats[endpoint.name] = endpoint.breaker.stats()
+        return stats
+
+    async def _hedged(self, path: str, params: Dict[str, Any], timeout: float, gate: Optional[Gate]) -> httpx.Response:
+        pending = list(self.endpoints)
+        tasks: Dict[asyncio.Future, Endpoint] = {}
+
+        def launch() -> Optional[Endpoint]:
+            # Start a request on the next endpoint whose circuit lets it through
+            while pending:
+                endpoint = pending.pop(0)
+                if endpoint.breaker.allow():
+                    endpoint_gate = gate if endpoint is self.endpoints[0] else None
+                    tasks[asyncio.ensure_future(self._request(endpoint, path, params, timeout, endpoint_gate))] = endpoint
+                    return endpoint
+            return None
+
+        primary = launch()
+        if primary is None:
+            self._stats["fast_failures"] += 1
+            raise UpstreamUnavailableError(f"{self.name} is unavailable (circuit open)")
+
+        last_error: Optional[BaseException] = None
+        try:
+            while tasks:
+                hedge = self.hedge_delay is not None and pending and last_error is None
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay if hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slow: race it against the next endpoint
+                    if launch() is not None:
+                        self._stats["hedged"] += 1
+                    continue
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    if task.exception() is None:
+                        if endpoint is not primary:
+                            self._stats["hedge_wins" if tasks else "failovers"] += 1
+                        return task.result()
+                    last_error = task.exception()
+                if not tasks and is_transient(last_error):
+                    # Everything in flight failed: fail over to the next endpoint
+                    launch()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _request(self, endpoint: Endpoint, path: str, params: Dict[str, Any], timeout: float,
+                       gate: Optional[Gate]) -> httpx.Response:
+        async def send() -> httpx.Response:
+            # Runs once per real upstream request (callers coalesced by the gate share it),
+            # so this is the only place the breaker learns about the endpoint's health
+            started = time.perf_counter()
+            try:
+                response = await self.get_client().get(f"{endpoint.base_url}{path}", params=params, timeout=timeout)
+            except httpx.TimeoutException:
+                metrics.observe_upstream(endpoint.name, "timeout", time.perf_counter() - started)
+                endpoint.breaker.record_failure()
+                raise
+            except httpx.HTTPError:
+                metrics.observe_upstream(endpoint.name, "error", time.perf_counter() - started)
+                endpoint.breaker.record_failure()
+                raise
+            metrics.observe_upstream(endpoint.name, response.status_code, time.perf_counter() - started)
+            if response.status_code in TRANSIENT_STATUSES:
+                endpoint.breaker.record_failure()
+            elif response.status_code != 429:
+                endpoint.breaker.record_success()  # the server answered, even if with a client error
+            return response
+
+        try:
+            response = await (gate(send) if gate is not None else send())
+        except BaseException:
+            # Cancelled (lost a hedge race) or rejected by the gate before reaching the server:
+            # neutral for the breaker, but an unfinished half-open trial must not block it
+            endpoint.breaker.cancel_trial()
+            raise
+        response.raise_for_status()
+        return response